@@ -1,16 +1,67 @@
 #!/usr/bin/python
 from __future__ import print_function
-import subprocess
+import compileall
+import glob
 import os
+import sys
+from src.core import runner
+from src.core.tree_sync import copy_file
+
+INSTALL_DIR = "/usr/share/mksec"
+CONFIG_DIR = "/etc/mksec"
+LAUNCHER = "/usr/local/bin/mksec"
+MANIFEST = "install.manifest"
+
+
+def manifest_files(path=MANIFEST):
+    # expands the glob patterns of the manifest into a sorted list of files
+    files = set()
+    with open(path, "r") as fileopen:
+        for line in fileopen:
+            pattern = line.split("#", 1)[0].strip()
+            if not pattern:
+                continue
+            matches = [name for name in glob.glob(pattern, recursive=True) if os.path.isfile(name)]
+            if not matches:
+                print("[!] Nothing in the tree matches manifest entry %s" % pattern)
+            files.update(matches)
+    return sorted(files)
+
+
 print("[*] Installing requirements.txt")
-subprocess.Popen("pip3 install -r requirements.txt", shell=True).wait()
-print("[*] Installing mksec to /usr/share/mksec")
+# pip runs while the files are copied, the two do not depend on each other
+requirements = runner.run_async([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
+                                echo=True, log=False)
+print("[*] Installing mksec to %s" % INSTALL_DIR)
 print(os.getcwd())
-subprocess.Popen("mkdir /usr/share/mksec/;mkdir /etc/mksec/;cp -rf * /usr/share/mksec/;cp src/core/config.baseline /etc/mksec/mksec.config", shell=True).wait()
+files = manifest_files()
+for name in files:
+    target = os.path.join(INSTALL_DIR, name)
+    if not os.path.isdir(os.path.dirname(target)):
+        os.makedirs(os.path.dirname(target))
+    copy_file(name, target)
+for directory in (os.path.join(INSTALL_DIR, "src", "logs"), CONFIG_DIR):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+print("[*] Copied %d files from %s" % (len(files), MANIFEST))
+
+# keep an edited config, setoolkit replaces outdated ones itself
+if not os.path.isfile(os.path.join(CONFIG_DIR, "set.config")):
+    copy_file("src/core/config.baseline", os.path.join(CONFIG_DIR, "set.config"))
+
+# the install is root owned, so bytecode has to be written now or every
+# launch would compile src/ again
+print("[*] Precompiling bytecode with %s" % sys.executable)
+if not compileall.compile_dir(os.path.join(INSTALL_DIR, "src"), quiet=1, workers=0):
+    print("[!] Some files failed to compile, see above.")
+
 print("[*] Creating launcher for mksec...")
-filewrite = open("/usr/local/bin/mksec", "w")
-filewrite.write("#!/bin/sh\ncd /usr/share/mksec\n./mksec")
+filewrite = open(LAUNCHER, "w")
+filewrite.write("#!/bin/sh\ncd %s\nexec %s ./setoolkit \"$@\"\n" % (INSTALL_DIR, sys.executable))
 filewrite.close()
 print("[*] Done. Chmoding +x")
-subprocess.Popen("chmod +x /usr/local/bin/mksec", shell=True).wait()
+os.chmod(LAUNCHER, 0o755)
+result = requirements.result()
+if not result.ok:
+    print("[!] Installing requirements.txt failed, pip %s." % result.describe())
 print("[*] Finished. Run 'mksec' to start the MKSecurity.")
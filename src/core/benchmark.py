@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+#
+# Benchmarks for the MKSEC core hot paths
+#
+# Every benchmark runs against synthetic fixtures in a temporary directory
+# (set.config, set.options and a template tree of configurable size), so
+# /etc/mksec, ~/.set and the MKSEC log are never touched. Results are
+# printed as a table, can be written as JSON and compared against a stored
+# baseline:
+#
+#   python3 -m src.core.benchmark [--keys N] [--files N] [--json out.json]
+#                                 [--baseline base.json] [--tolerance 0.15]
+#                                 [--only NAME ...]
+#
+# With --baseline the exit code is 1 when any benchmark got slower than
+# the tolerance allows.
+#
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.core import core_mksec
+from src.core import logger
+from src.core import renderer
+from src.core import update_config as update_config_module
+from src.core.config_store import ConfigStore
+from src.core.menu import text
+from src.core.session_state import SessionStore
+from src.core.startup_report import STARTUP_MODULES
+
+DEFAULT_KEYS = 200
+DEFAULT_FILES = 200
+DEFAULT_FILE_SIZE = 16 * 1024
+DEFAULT_TOLERANCE = 0.15
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# fixtures
+
+def make_config(path, keys):
+    with open(os.path.join(ROOT, "src", "core", "config.baseline"), "r") as fileopen:
+        baseline = fileopen.read()
+    with open(path, "w") as filewrite:
+        filewrite.write(baseline)
+        for number in range(keys):
+            filewrite.write("### synthetic setting %d\nBENCH_SETTING_%d=value-%d\n" % (number, number, number))
+
+
+def make_options(path, keys):
+    store = SessionStore(path)
+    store.reset()
+    for number in range(keys):
+        store.set("BENCH_OPTION_%d" % number, "value-%d" % number)
+    store.compact()
+    store.close()
+
+
+def make_tree(path, files, size):
+    chunk = os.urandom(size)
+    for number in range(files):
+        directory = os.path.join(path, "dir%02d" % (number % 10))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, "file%05d.html" % number), "wb") as filewrite:
+            filewrite.write(chunk)
+
+
+@contextlib.contextmanager
+def patched(owner, **values):
+    saved = dict((name, getattr(owner, name)) for name in values)
+    for name, value in values.items():
+        setattr(owner, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(owner, name, value)
+
+
+# timing
+
+def measure(func, number=None, repeat=5, budget=0.2):
+    """
+    Times func() and returns per-call statistics in microseconds. number
+    is picked so one repetition takes roughly budget seconds.
+    """
+
+    if number is None:
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = time.perf_counter() - started
+            if elapsed >= budget / 10 or number >= 1000000:
+                number = max(1, int(number * budget / max(elapsed, 1e-9) / 10) or 1)
+                break
+            number *= 10
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    samples.sort()
+    return {"min_us": samples[0], "median_us": samples[len(samples) // 2],
+            "max_us": samples[-1], "number": number, "repeat": repeat}
+
+
+# benchmarks, each takes the fixture directory and the options
+
+def bench_check_config(workdir, options):
+    store = ConfigStore(os.path.join(workdir, "set.config"))
+    last = "BENCH_SETTING_%d=" % (options.keys - 1)
+    with patched(core_mksec, config=store):
+        return measure(lambda: core_mksec.check_config(last))
+
+
+def bench_check_options(workdir, options):
+    store = SessionStore(os.path.join(workdir, "set.options"))
+    last = "BENCH_OPTION_%d=" % (options.keys - 1)
+    with patched(core_mksec, session=store):
+        return measure(lambda: core_mksec.check_options(last))
+
+
+def bench_update_options(workdir, options):
+    store = SessionStore(os.path.join(workdir, "set.options"))
+    counter = [0]
+
+    def update():
+        counter[0] += 1
+        core_mksec.update_options("BENCH_OPTION_%d=%d" % (counter[0] % options.keys, counter[0]))
+    with patched(core_mksec, session=store):
+        result = measure(update)
+    store.close()
+    return result
+
+
+def bench_is_valid_ipv4(workdir, options):
+    addresses = ["10.%d.%d.%d" % (n % 256, (n // 256) % 256, n % 200) for n in range(256)]
+    index = [0]
+
+    def check():
+        index[0] = (index[0] + 1) & 255
+        core_mksec.is_valid_ipv4(addresses[index[0]])
+    return measure(check)
+
+
+def bench_is_valid_ipv6(workdir, options):
+    addresses = ["2001:db8::%x:%x" % (n, n * 7) for n in range(256)]
+    index = [0]
+
+    def check():
+        index[0] = (index[0] + 1) & 255
+        core_mksec.is_valid_ipv6(addresses[index[0]])
+    return measure(check)
+
+
+def bench_setprompt(workdir, options):
+    return measure(lambda: core_mksec.setprompt(["2", "11"], "IP address for the reverse handler"))
+
+
+def bench_create_menu(workdir, options):
+    def render():
+        with contextlib.redirect_stdout(io.StringIO()):
+            core_mksec.create_menu(text.main_text, text.main_menu)
+    return measure(render)
+
+
+def bench_create_menu_cold(workdir, options):
+    def render():
+        renderer.invalidate()
+        with contextlib.redirect_stdout(io.StringIO()):
+            core_mksec.create_menu(text.main_text, text.main_menu)
+    return measure(render)
+
+
+def _update_config_paths(workdir):
+    return {"CONFIG_PATH": os.path.join(workdir, "set.config"),
+            "CONFIG_DIR": workdir,
+            "GENERATED_PATH": os.path.join(workdir, "set_config.py"),
+            "SNAPSHOT_PATH": os.path.join(workdir, "set_config.json")}
+
+
+def bench_update_config(workdir, options):
+    with patched(update_config_module, **_update_config_paths(workdir)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return measure(lambda: update_config_module.update_config(force=True), repeat=3)
+
+
+def bench_update_config_unchanged(workdir, options):
+    with patched(update_config_module, **_update_config_paths(workdir)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            update_config_module.update_config(force=True)
+            return measure(update_config_module.update_config)
+
+
+def bench_startup(workdir, options):
+    # a fresh interpreter doing the imports setoolkit does before the first menu
+    argv = [sys.executable, "-c", "import " + ", ".join(STARTUP_MODULES)]
+    env = dict(os.environ, HOME=workdir)
+
+    def start():
+        subprocess.run(argv, cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start()
+    return measure(start, number=1, repeat=options.runs)
+
+
+def bench_copyfolder(workdir, options):
+    source = os.path.join(workdir, "tree")
+    counter = [0]
+
+    def copy():
+        counter[0] += 1
+        with contextlib.redirect_stdout(io.StringIO()):
+            core_mksec.copyfolder(source, os.path.join(workdir, "copy-%d" % counter[0]))
+    return measure(copy, number=1, repeat=options.runs)
+
+
+def bench_copyfolder_unchanged(workdir, options):
+    source = os.path.join(workdir, "tree")
+    dest = os.path.join(workdir, "copy-unchanged")
+    with contextlib.redirect_stdout(io.StringIO()):
+        core_mksec.copyfolder(source, dest)
+    return measure(lambda: core_mksec.copyfolder(source, dest), number=1, repeat=options.runs)
+
+
+BENCHMARKS = [
+    ("check_config", bench_check_config),
+    ("check_options", bench_check_options),
+    ("update_options", bench_update_options),
+    ("is_valid_ipv4", bench_is_valid_ipv4),
+    ("is_valid_ipv6", bench_is_valid_ipv6),
+    ("setprompt", bench_setprompt),
+    ("create_menu", bench_create_menu),
+    ("create_menu_cold", bench_create_menu_cold),
+    ("update_config", bench_update_config),
+    ("update_config_unchanged", bench_update_config_unchanged),
+    ("startup", bench_startup),
+    ("copyfolder", bench_copyfolder),
+    ("copyfolder_unchanged", bench_copyfolder_unchanged),
+]
+
+
+def run(options):
+    workdir = tempfile.mkdtemp(prefix="mksec-bench-")
+    results = {}
+    try:
+        make_config(os.path.join(workdir, "set.config"), options.keys)
+        make_options(os.path.join(workdir, "set.options"), options.keys)
+        make_tree(os.path.join(workdir, "tree"), options.files, options.file_size)
+        with patched(logger, log_path=lambda: os.path.join(workdir, "logs", "mksec.log")):
+            for name, func in BENCHMARKS:
+                if options.only and name not in options.only:
+                    continue
+                results[name] = func(workdir, options)
+            logger.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "keys": options.keys,
+            "files": options.files,
+            "file_size": options.file_size,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Returns (name, baseline median, current median, ratio, regressed) rows
+    for every benchmark present in both result sets.
+    """
+
+    rows = []
+    for name, result in sorted(current["results"].items()):
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        ratio = result["median_us"] / previous["median_us"] if previous["median_us"] else 0.0
+        rows.append((name, previous["median_us"], result["median_us"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def _format_us(value):
+    if value >= 1e6:
+        return "%.2f s" % (value / 1e6)
+    if value >= 1e3:
+        return "%.2f ms" % (value / 1e3)
+    return "%.2f us" % value
+
+
+def print_results(current):
+    meta = current["meta"]
+    print("[*] MKSEC core benchmarks (python %s, %d keys, %d files of %d bytes)" % (
+        meta["python"], meta["keys"], meta["files"], meta["file_size"]))
+    print("\n  %-26s %12s %12s %10s" % ("benchmark", "median", "min", "calls"))
+    for name, result in sorted(current["results"].items()):
+        print("  %-26s %12s %12s %10d" % (name, _format_us(result["median_us"]),
+                                          _format_us(result["min_us"]), result["number"]))
+
+
+def print_comparison(rows, tolerance):
+    print("\n  %-26s %12s %12s %8s" % ("benchmark", "baseline", "current", "ratio"))
+    for name, before, after, ratio, regressed in rows:
+        print("  %-26s %12s %12s %7.2fx%s" % (name, _format_us(before), _format_us(after), ratio,
+                                             "  [!] slower" if regressed else ""))
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print("\n[!] %d benchmarks are more than %d%% slower than the baseline" % (
+            len(regressions), tolerance * 100))
+    else:
+        print("\n[*] no benchmark is more than %d%% slower than the baseline" % (tolerance * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="MKSEC core benchmarks")
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS,
+                        help="synthetic settings in set.config and options in set.options")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES, help="files in the copyfolder tree")
+    parser.add_argument("--file-size", type=int, default=DEFAULT_FILE_SIZE, help="bytes per tree file")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions of the slow benchmarks")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="run only these benchmarks")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against results written earlier with --json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown against the baseline, 0.15 = 15%%")
+    args = parser.parse_args()
+
+    current = run(args)
+    print_results(current)
+    if args.json:
+        with open(args.json, "w") as filewrite:
+            json.dump(current, filewrite, indent=2, sort_keys=True)
+        print("\n[*] results written to %s" % args.json)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r") as fileopen:
+            status = print_comparison(compare(current, json.load(fileopen), args.tolerance), args.tolerance)
+    sys.exit(status)
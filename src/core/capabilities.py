@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Host capability index for MKSEC
+#
+# Facts about the machine that used to be re-derived on every call:
+#
+#   host   operating system, distribution (Kali, BackBox) and root status,
+#          probed once per process since none of them change under us
+#   tools  where the external programs MKSEC drives live, resolved from
+#          set.config first, then PATH, then the usual install locations
+#
+# The tool index is rebuilt only when set.config or PATH changes, so
+# interactive code can ask for a path as often as it likes for the price
+# of one stat() of the config file.
+#
+import os
+import threading
+
+from src.core.config_store import config
+
+# tool name -> (set.config key or None, fallback locations tried after PATH)
+# a config value naming a directory (METASPLOIT_PATH) is searched for the tool
+TOOLS = {
+    "airbase-ng": ("AIRBASE_NG_PATH", ("/usr/local/sbin/airbase-ng", "/usr/sbin/airbase-ng")),
+    "dnsspoof": ("DNSSPOOF_PATH", ("/usr/local/sbin/dnsspoof", "/usr/sbin/dnsspoof")),
+    "apache2": (None, ("/usr/sbin/apache2",)),
+    "upx": ("UPX_PATH", ("/usr/bin/upx",)),
+    "msfconsole": ("METASPLOIT_PATH", ("/usr/bin/msfconsole", "/opt/metasploit-framework/bin/msfconsole")),
+    "git": (None, ()),
+}
+
+_lock = threading.Lock()
+_host = None
+_tools = None
+_tools_key = None
+
+
+class Host:
+    """ What the rest of MKSEC needs to know about the machine. """
+
+    __slots__ = ("os_name", "distro", "debian", "root")
+
+    def __init__(self, os_name, distro, debian, root):
+        self.os_name = os_name
+        self.distro = distro
+        self.debian = debian
+        self.root = root
+
+    def __repr__(self):
+        return "<Host %s %s root=%s>" % (self.os_name, self.distro or "unknown", self.root)
+
+
+def _read(path):
+    try:
+        with open(path, "r") as fileopen:
+            return fileopen.read()
+    except (IOError, OSError):
+        return None
+
+
+def _probe_host():
+    os_name = "windows" if os.name == "nt" else "posix"
+    if os_name == "windows":
+        return Host(os_name, None, False, False)
+    issue = _read("/etc/issue")
+    sources = _read("/etc/apt/sources.list")
+    distro = None
+    if sources is not None and "kali" in sources:
+        distro = "Kali"
+    elif issue is not None and "BackBox" in issue:
+        distro = "BackBox"
+    return Host(os_name, distro, sources is not None or issue is not None, os.geteuid() == 0)
+
+
+def host():
+    """ The Host of this process, probed on first use. """
+
+    global _host
+    if _host is None:
+        with _lock:
+            if _host is None:
+                _host = _probe_host()
+    return _host
+
+
+def operating_system():
+    # "posix" or "windows", no probing needed
+    return "windows" if os.name == "nt" else "posix"
+
+
+def is_root():
+    return host().root
+
+
+def _executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _resolve(name, key, fallbacks, search_path):
+    configured = config.get(key, "").strip() if key else ""
+    if configured:
+        if os.path.isdir(configured):
+            configured = os.path.join(configured, name)
+        if _executable(configured):
+            return configured
+    for directory in search_path:
+        candidate = os.path.join(directory, name)
+        if _executable(candidate):
+            return candidate
+    for candidate in fallbacks:
+        if _executable(candidate):
+            return candidate
+    return None
+
+
+def tools():
+    """
+    Returns the tool index, name -> absolute path or None when the tool
+    was not found. Rebuilt when set.config or PATH has changed.
+    """
+
+    global _tools, _tools_key
+    search = os.environ.get("PATH", "")
+    key = (config.signature(), search)
+    with _lock:
+        if _tools is None or key != _tools_key:
+            search_path = [directory for directory in search.split(os.pathsep) if directory]
+            _tools = dict((name, _resolve(name, entry[0], entry[1], search_path))
+                          for name, entry in TOOLS.items())
+            _tools_key = key
+        return _tools
+
+
+def tool(name):
+    # the path of one tool, None when it is not installed
+    return tools().get(name)
+
+
+def invalidate():
+    # forget everything, the next lookup probes again
+    global _host, _tools, _tools_key
+    with _lock:
+        _host = None
+        _tools = None
+        _tools_key = None
+
+
+def report():
+    lines = ["host:  %r" % (host(),)]
+    for name, path in sorted(tools().items()):
+        lines.append("%-12s %s" % (name, path or "not found"))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(report())
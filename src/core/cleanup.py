@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+#
+# Startup cleanup of the MKSEC user directory (~/.set)
+#
+# Everything left over from the previous session is removed, except for
+# entries matching the exclusion policy below. Doomed top level entries are
+# first renamed into a trash directory, which only costs one rename each,
+# so the caller can carry on (and recreate set.options, reports/ ...)
+# right away while the actual deletion runs on background threads.
+#
+import os
+import re
+import shutil
+import threading
+import time
+
+# entries whose name matches are kept; the historical SVN names plus the
+# state we deliberately carry between sessions. reports/ itself is kept so
+# the --profile reports in it (profile-*) survive, the rest of it still goes
+EXCLUDE = re.compile(r".svn|entries|all-wcprops|props|text-base|prop-base|tmp|version\.lock|^reports$|^profile-")
+
+# prefix of the per-run trash directories, <prefix><pid>-<time_ns>-<n>.
+# Trash of a cleanup that is still running (another launch, a daemon
+# session) is left alone; it is reclaimed once its pid is gone or it is
+# older than TRASH_MAX_AGE seconds
+TRASH_PREFIX = ".mksec-cleanup-tmp-"
+TRASH_MAX_AGE = 3600
+
+WORKERS = 4
+
+
+class CleanupReport:
+    """ What a cleanup run removed (or would remove, for a dry run). """
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        self.errors = 0
+        self.started = time.time()
+        self.finished = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, files=0, dirs=0, size=0, errors=0):
+        with self._lock:
+            self.files += files
+            self.dirs += dirs
+            self.bytes += size
+            self.errors += errors
+
+    def finish(self, callback=None):
+        self.finished = time.time()
+        self.done.set()
+        if callback is not None:
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+    @property
+    def duration(self):
+        return (self.finished or time.time()) - self.started
+
+    def summary(self):
+        return "%s %d files, %d directories, %d bytes in %.3fs (%d errors)" % (
+            "would remove" if self.dry_run else "removed",
+            self.files, self.dirs, self.bytes, self.duration, self.errors)
+
+    def as_dict(self):
+        return {"dry_run": self.dry_run, "files": self.files, "dirs": self.dirs,
+                "bytes": self.bytes, "errors": self.errors, "duration": self.duration}
+
+
+def _collect(path, report, doomed):
+    """
+    Walks path with scandir and sorts its entries into doomed (removed as a
+    whole) or recursed into (excluded directories still get their
+    non-excluded files cleaned, as the old os.walk loop did).
+    """
+
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        report.add(errors=1)
+        return
+    for entry in entries:
+        if entry.name.startswith(TRASH_PREFIX):
+            # leftovers from a run that was interrupted go, live trash stays
+            if _abandoned(entry):
+                doomed.append(entry)
+            continue
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            is_dir = False
+        if EXCLUDE.search(entry.name):
+            if is_dir:
+                _collect(entry.path, report, doomed)
+            continue
+        doomed.append(entry)
+
+
+def _abandoned(entry):
+    """
+    True for trash no cleanup is working on any more: its pid is not
+    running, or it is older than TRASH_MAX_AGE (the pid was reused, as
+    pid 1 is in every container).
+    """
+
+    fields = entry.name[len(TRASH_PREFIX):].split("-")
+    try:
+        pid = int(fields[0])
+    except ValueError:
+        return True
+    try:
+        created = int(fields[1]) / 1e9 if len(fields) > 1 else entry.stat(follow_symlinks=False).st_mtime
+    except (ValueError, OSError):
+        created = 0
+    if time.time() - created > TRASH_MAX_AGE:
+        return True
+    if pid == os.getpid():
+        # this run makes its trash only after collecting, so it is older
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # running under another user
+        return False
+    return False
+
+
+def _measure(path, report):
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            dirs = 1
+            files = 0
+            size = 0
+            for root, subdirs, names in os.walk(path):
+                dirs += len(subdirs)
+                for name in names:
+                    files += 1
+                    try:
+                        size += os.lstat(os.path.join(root, name)).st_size
+                    except OSError:
+                        pass
+            report.add(dirs=dirs, files=files, size=size)
+        else:
+            report.add(files=1, size=os.lstat(path).st_size)
+    except OSError:
+        report.add(errors=1)
+
+
+def _remove(path, report):
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    except OSError:
+        report.add(errors=1)
+
+
+def _make_trash(path):
+    """
+    Creates a new, private trash directory in path and returns it, None if
+    that fails. Does what tempfile.mkdtemp() does without importing
+    tempfile, which would bring random (a deferred module) into startup.
+    """
+
+    base = os.path.join(path, "%s%d-%d-" % (TRASH_PREFIX, os.getpid(), time.time_ns()))
+    for attempt in range(100):
+        try:
+            os.mkdir(base + str(attempt), 0o700)
+        except FileExistsError:
+            continue
+        except OSError:
+            return None
+        return base + str(attempt)
+    return None
+
+
+def clean(path, dry_run=False, background=True, workers=WORKERS, callback=None):
+    """
+    Cleans path and returns a CleanupReport.
+
+    With background=True (the default) this returns as soon as the doomed
+    entries are moved out of the way; counting and deleting happen on
+    background threads and report.done is set when they finish. dry_run
+    only counts what would be removed and never runs in the background.
+    callback, if given, is called with the finished report.
+    """
+
+    report = CleanupReport(dry_run)
+    if not os.path.isdir(path):
+        report.finish(callback)
+        return report
+
+    doomed = []
+    _collect(path, report, doomed)
+
+    if dry_run:
+        for entry in doomed:
+            _measure(entry.path, report)
+        report.finish(callback)
+        return report
+
+    # move everything into one trash directory, cheap and synchronous. Its
+    # name must be new: trash of an earlier run can carry the same pid (pid
+    # 1 in a container) and deleting in place would race the caller
+    trash = None
+    targets = []
+    if doomed:
+        trash = _make_trash(path)
+        for index, entry in enumerate(doomed):
+            if trash is not None and not entry.name.startswith(TRASH_PREFIX):
+                try:
+                    moved = os.path.join(trash, "%d-%s" % (index, entry.name))
+                    os.rename(entry.path, moved)
+                    targets.append(moved)
+                    continue
+                except OSError:
+                    pass
+            targets.append(entry.path)
+
+    def _delete():
+        for target in targets:
+            _measure(target, report)
+        # plain threads, concurrent.futures would add its imports to startup
+        pending = iter(targets)
+        pending_lock = threading.Lock()
+
+        def _work():
+            while True:
+                with pending_lock:
+                    target = next(pending, None)
+                if target is None:
+                    return
+                _remove(target, report)
+
+        threads = [threading.Thread(target=_work, name="mksec-cleanup-%d" % (number + 1))
+                   for number in range(min(workers, len(targets)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if targets and trash is not None:
+            _remove(trash, report)
+        report.finish(callback)
+
+    if background and targets:
+        worker = threading.Thread(target=_delete, name="mksec-cleanup")
+        worker.daemon = True
+        worker.start()
+    else:
+        _delete()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Clean the MKSEC user directory")
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.expanduser("~"), ".set"))
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    args = parser.parse_args()
+    result = clean(args.path, dry_run=args.dry_run, background=False)
+    print("[*] %s: %s" % (args.path, result.summary()))
+    sys.exit(1 if result.errors else 0)
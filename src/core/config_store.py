@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+# Indexed, self-invalidating view of the MKSEC set.config file
+#
+import os
+
+# the one config file every part of MKSEC reads from
+CONFIG_PATH = "/etc/mksec/set.config"
+
+
+class ConfigStore:
+    """
+    Parses set.config once into a keyed index and hands out O(1) lookups.
+
+    The file is only re-read when its inode, size or mtime changes, so
+    callers on the interactive path can ask for values as often as they
+    like without touching anything but a single stat() call.
+    """
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self._signature = None
+        self._index = {}
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _parse(self):
+        index = {}
+        try:
+            with open(self.path, "r") as fileopen:
+                for line in fileopen:
+                    line = line.strip()
+                    # skip comments, banners and anything that isn't KEY=VALUE
+                    if not line or line.startswith("#") or "=" not in line:
+                        continue
+                    key, value = line.split("=", 1)
+                    key = key.strip()
+                    # the first definition wins, same as the old line scanner
+                    if key not in index:
+                        # remove any quotes or single quotes
+                        index[key] = value.replace('"', "").replace("'", "")
+        except IOError:
+            pass
+        return index
+
+    def refresh(self, force=False):
+        signature = self._stat_signature()
+        if force or signature != self._signature:
+            self._index = self._parse() if signature is not None else {}
+            self._signature = signature
+        return self._index
+
+    def signature(self):
+        # the signature the current index was built from
+        self.refresh()
+        return self._signature
+
+    def get(self, key, default=None):
+        # accept both "KEY" and the legacy "KEY=" form
+        if key.endswith("="):
+            key = key[:-1]
+        return self.refresh().get(key, default)
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if value is None:
+            return default
+        return value.strip().upper() in ("ON", "YES", "TRUE", "1")
+
+    def get_int(self, key, default=0):
+        value = self.get(key)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    def items(self):
+        return dict(self.refresh())
+
+    def __contains__(self, key):
+        return key in self.refresh()
+
+
+# shared instance used throughout MKSEC
+config = ConfigStore()
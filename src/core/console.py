@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+#
+# Console output for MKSEC
+#
+# install() wraps sys.stdout and sys.stderr once, at startup, in a
+# ConsoleStream. Every print(), print_* helper and rendered frame goes
+# through it:
+#
+#   - ANSI color codes are dropped when the real stream is not a terminal,
+#     so piped and redirected runs get plain text
+#   - terminal output is no longer flushed line by line; pending output is
+#     written in one go before every prompt (input() flushes stdout) or at
+#     the latest FLUSH_INTERVAL seconds after it was produced
+#   - capture() and tee() copy what the calling thread writes into a
+#     bounded sink (memory or a file); output of background jobs and other
+#     threads is left alone. Without install() the stream is only wrapped
+#     for the length of the block
+#
+import re
+import sys
+import threading
+import time
+
+# longest delay between output being written and reaching the terminal
+FLUSH_INTERVAL = 0.05
+
+# characters a capture or tee keeps before it stops recording
+CAPTURE_LIMIT = 1024 * 1024
+
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+_lock = threading.Lock()
+_dirty = threading.Event()
+_flusher = None
+# streams capture() wrapped for the length of a block, name -> [stream, users]
+_borrowed = {}
+
+
+def strip_ansi(text):
+    if "\x1b" not in text:
+        return text
+    return ANSI_PATTERN.sub("", text)
+
+
+def is_tty(stream=None):
+    stream = sys.stdout if stream is None else stream
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+class Sink:
+    """
+    Bounded recorder for a capture or a tee. Keeps at most limit
+    characters; truncated tells whether anything was dropped.
+    """
+
+    def __init__(self, target=None, limit=CAPTURE_LIMIT, passthrough=False):
+        import io
+        self.target = io.StringIO() if target is None else target
+        self.limit = limit
+        self.passthrough = passthrough
+        self.written = 0
+        self.truncated = False
+
+    def write(self, text):
+        room = self.limit - self.written
+        if room <= 0:
+            self.truncated = self.truncated or bool(text)
+            return
+        if len(text) > room:
+            text = text[:room]
+            self.truncated = True
+        self.target.write(text)
+        self.written += len(text)
+
+    def getvalue(self):
+        return self.target.getvalue() if hasattr(self.target, "getvalue") else None
+
+
+class ConsoleStream:
+    """ The stream installed as sys.stdout / sys.stderr by install(). """
+
+    def __init__(self, stream, name):
+        self._stream = stream
+        self.name = name
+        self._tty = is_tty(stream)
+        # capture sinks belong to the thread that added them
+        self._local = threading.local()
+
+    @property
+    def wrapped(self):
+        return self._stream
+
+    def isatty(self):
+        return self._tty
+
+    def write(self, text):
+        sinks = getattr(self._local, "sinks", None)
+        if sinks:
+            plain = strip_ansi(text)
+            passthrough = True
+            for sink in list(sinks):
+                sink.write(plain)
+                passthrough = passthrough and sink.passthrough
+            if not passthrough:
+                return len(text)
+        if not self._tty:
+            text = strip_ansi(text)
+        written = self._stream.write(text)
+        if self._tty and not _dirty.is_set():
+            _dirty.set()
+        return written
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self._stream.flush()
+
+    def add_sink(self, sink):
+        # records what the calling thread writes from now on
+        sinks = getattr(self._local, "sinks", None)
+        if sinks is None:
+            sinks = self._local.sinks = []
+        sinks.append(sink)
+
+    def remove_sink(self, sink):
+        sinks = getattr(self._local, "sinks", None)
+        if sinks and sink in sinks:
+            sinks.remove(sink)
+
+    def __getattr__(self, name):
+        # fileno, encoding, buffer ... come from the real stream
+        return getattr(self._stream, name)
+
+
+def _flush_loop():
+    while True:
+        _dirty.wait()
+        # let the rest of the burst arrive, then write it in one go
+        time.sleep(FLUSH_INTERVAL)
+        _dirty.clear()
+        flush()
+
+
+def installed():
+    return isinstance(sys.stdout, ConsoleStream)
+
+
+def install():
+    """ Puts the console in front of sys.stdout and sys.stderr, once. """
+
+    global _flusher
+    with _lock:
+        # a stream a capture() wrapped for the moment stays for good now
+        _borrowed.clear()
+        if not isinstance(sys.stdout, ConsoleStream):
+            stdout = sys.stdout
+            if is_tty(stdout) and hasattr(stdout, "reconfigure"):
+                # the flusher and input() take over from line buffering
+                stdout.reconfigure(line_buffering=False)
+            sys.stdout = ConsoleStream(stdout, "stdout")
+        if not isinstance(sys.stderr, ConsoleStream):
+            sys.stderr = ConsoleStream(sys.stderr, "stderr")
+        # a forked session starts without the parent's flusher thread
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="mksec-console")
+            _flusher.daemon = True
+            _flusher.start()
+
+
+def write(text, stream=None):
+    """
+    Writes text to stream (sys.stdout by default) without flushing, colors
+    removed when it is not a terminal.
+    """
+
+    stream = sys.stdout if stream is None else stream
+    if not isinstance(stream, ConsoleStream) and not is_tty(stream):
+        text = strip_ansi(text)
+    stream.write(text)
+
+
+def flush():
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (AttributeError, ValueError, OSError):
+            pass
+
+
+def _borrow(name):
+    # the ConsoleStream in front of sys.<name>, put there for now if need be
+    with _lock:
+        stream = getattr(sys, name)
+        entry = _borrowed.get(name)
+        if isinstance(stream, ConsoleStream):
+            if entry is not None and entry[0] is stream:
+                entry[1] += 1
+            return stream
+        stream = ConsoleStream(stream, name)
+        setattr(sys, name, stream)
+        _borrowed[name] = [stream, 1]
+        return stream
+
+
+def _release(name, stream):
+    # puts the real stream back once the last capture on it has ended
+    with _lock:
+        entry = _borrowed.get(name)
+        if entry is None or entry[0] is not stream:
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _borrowed[name]
+            if getattr(sys, name) is stream:
+                setattr(sys, name, stream.wrapped)
+
+
+class capture:
+    """
+    Records what is written to stdout (or stream="stderr") inside the
+    block, without the colors:
+
+        with console.capture() as out:
+            print_status("...")
+        text = out.getvalue()
+
+    Only the calling thread's output is recorded, and kept from the
+    terminal unless passthrough is True. With path the record goes to that
+    file instead of memory. At most limit characters are kept either way.
+    """
+
+    def __init__(self, stream="stdout", limit=CAPTURE_LIMIT, path=None, passthrough=False):
+        self.stream_name = stream
+        self.limit = limit
+        self.path = path
+        self.passthrough = passthrough
+        self.sink = None
+        self._stream = None
+        self._file = None
+
+    def __enter__(self):
+        flush()
+        if self.path is not None:
+            self._file = open(self.path, "a")
+        self.sink = Sink(self._file, self.limit, self.passthrough)
+        self._stream = _borrow(self.stream_name)
+        self._stream.add_sink(self.sink)
+        return self.sink
+
+    def __exit__(self, *exc):
+        self._stream.remove_sink(self.sink)
+        _release(self.stream_name, self._stream)
+        if self._file is not None:
+            self._file.close()
+        return False
+
+
+def tee(path, stream="stdout", limit=CAPTURE_LIMIT):
+    # copies the block's output to path, the terminal still gets it
+    return capture(stream, limit, path, passthrough=True)
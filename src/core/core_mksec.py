@@ -2,36 +2,23 @@
 #
 # Centralized core modules for MKSEC
 #
+# Only cheap modules are imported here. Anything heavy (socket, subprocess,
+# urllib, multiprocessing, inspect, random ...) is imported inside the
+# function that needs it so the first menu is not held up by features the
+# user may never touch. src/core/startup_report.py enforces this.
+#
 import re
 import sys
-import socket
-import subprocess
-import shutil
 import os
 import time
 import datetime
-import random
-import inspect
+from src.core import capabilities
+from src.core import console
 from src.core import dictionaries
-import io
-
-# python 2 and 3 compatibility
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib import urlopen
-import multiprocessing
-
-if sys.version_info >= (3, 0):
-    # python 3 removes reduce from builtin and into functools
-    from functools import *
-
-# needed for backwards compatibility of python2 vs 3 - need to convert to
-# threading eventually
-try:
-    import thread
-except ImportError:
-    import _thread as thread
+from src.core import renderer
+from src.core import trace
+from src.core.config_store import config
+from src.core.session_state import SessionStore
 
 try:
     raw_input
@@ -52,11 +39,7 @@ def definepath():
 # check operating system
 
 def check_os():
-    if os.name == "nt":
-        operating_system = "windows"
-    if os.name == "posix":
-        operating_system = "posix"
-    return operating_system
+    return capabilities.operating_system()
 
 # class for colors
 if check_os() == "posix":
@@ -144,37 +127,33 @@ else:
 
 # this will be the home for the set menus
 
+# rendered "mksec:webattack:..." prefixes, keyed by category path and color mode
+_prompt_prefixes = {}
+
+def prompt_prefix(category):
+    key = (category if isinstance(category, str) else tuple(category), bcolors.ENDC)
+    prefix = _prompt_prefixes.get(key)
+    if prefix is None:
+        # initialize the base 'mksec' prompt
+        parts = [bcolors.UNDERL + bcolors.DARKCYAN + "mksec" + bcolors.ENDC]
+        if category != '0':
+            for level in category:
+                parts.append(":" + bcolors.UNDERL + bcolors.DARKCYAN +
+                             dictionaries.category(level) + bcolors.ENDC)
+        prefix = _prompt_prefixes[key] = "".join(parts)
+    return prefix
+
 def setprompt(category, text):
+    # the colored prefix is built once per category path, only the text is added here
+    prefix = prompt_prefix(category)
     # if no special prompt and no text, return plain prompt
-    if category == '0' and text == "":
-        return bcolors.UNDERL + bcolors.DARKCYAN + "mksec" + bcolors.ENDC + " > "
-    # if the loop is here, either category or text was positive
+    if text == "":
+        return prefix + " > "
     # if it's the category that is blank...return prompt with only the text
     if category == '0':
-        return bcolors.UNDERL + bcolors.DARKCYAN + "mksec" + bcolors.ENDC + "> " + text + ": "
-    # category is NOT blank
-    else:
-        # initialize the base 'mksec' prompt
-        prompt = bcolors.UNDERL + bcolors.DARKCYAN + "mksec" + bcolors.ENDC
-        # if there is a category but no text
-        if text == "":
-            for level in category:
-                level = dictionaries.category(level)
-                prompt += ":" + bcolors.UNDERL + \
-                    bcolors.DARKCYAN + level + bcolors.ENDC
-            promptstring = str(prompt)
-            promptstring += " > "
-            return promptstring
-        # if there is both a category AND text
-        else:
-            # iterate through the list received
-            for level in category:
-                level = dictionaries.category(level)
-                prompt += ":" + bcolors.UNDERL + \
-                    bcolors.DARKCYAN + level + bcolors.ENDC
-            promptstring = str(prompt)
-            promptstring = promptstring + " > " + text + ": "
-            return promptstring
+        return prefix + "> " + text + ": "
+    # there is both a category AND text
+    return prefix + " > " + text + ": "
 
 
 def yesno_prompt(category, text):
@@ -193,115 +172,151 @@ def yesno_prompt(category, text):
     return response
 
 
+def ip_prompt(category, text):
+    """
+    Asks for an address like raw_input(setprompt(...)) but refuses IPs that
+    fall outside the engagement scope (SCOPE_ALLOW_FILE / SCOPE_DENY_FILE).
+    Addresses come back in their canonical form, so 0x0a010203 is checked
+    and used as 10.1.2.3. Empty answers and hostnames are handed back
+    unchecked; while a configured scope file cannot be loaded every address
+    is refused.
+    """
+    while True:
+        response = raw_input(setprompt(category, text)).strip()
+        if response == "" or not (config.get("SCOPE_ALLOW_FILE", "") or config.get("SCOPE_DENY_FILE", "")):
+            return response
+        from src.core import scope
+        address = scope.canonical_address(response)
+        if address is None:
+            return response
+        try:
+            if scope.in_scope(address):
+                return str(address)
+        except scope.ScopeError as error:
+            print_error("Could not load the scope files, no address can be checked: %s" % error)
+            continue
+        print_error("%s is outside the engagement scope, enter another address." % response)
+
+
 def return_continue():
     print(("\n      Press " + bcolors.RED + "<return> " + bcolors.ENDC + "to continue"))
     pause = raw_input()
 
 # DEBUGGING #############
-# ALWAYS SET TO ZERO BEFORE COMMIT!
-DEBUG_LEVEL = 0
-#  0 = Debugging OFF
-#  1 = debug imports only
-#  2 = debug imports with pause for <ENTER>
-#  3 = imports, info messages
-#  4 = imports, info messages with pause for <ENTER>
-#  5 = imports, info messages, menus
-#  6 = imports, info messages, menus with pause for <ENTER>
+# the level comes from MKSEC_DEBUG or DEBUG_LEVEL in set.config, see
+# src/core/trace.py for the levels. debug_msg is the tracer itself so a
+# disabled trace costs one call and one comparison.
 
 debugFrameString = '-' * 72
 
-
-def debug_msg(currentModule, message, msgType):
-    if DEBUG_LEVEL == 0:
-        pass  # stop evaluation efficiently
-    else:
-        if msgType <= DEBUG_LEVEL:
-            # a bit more streamlined
-            print(bcolors.RED + "\nDEBUG_MSG: from module '" +
-                  currentModule + "': " + message + bcolors.ENDC)
-
-            if DEBUG_LEVEL == 2 or DEBUG_LEVEL == 4 or DEBUG_LEVEL == 6:
-                raw_input("waiting for <ENTER>\n")
+debug_msg = trace.event
 
 
 def mod_name():
-    frame_records = inspect.stack()[1]
-    calling_module = inspect.getmodulename(frame_records[1])
-    return calling_module
+    # module name of our caller, read from its frame
+    return trace.caller(1)
 
-# runtime messages
+# runtime messages, written through src/core/console.py so they lose their
+# colors when the output is not a terminal
 
 def print_status(message):
-    print(bcolors.GREEN + bcolors.BOLD + "[*] " + bcolors.ENDC + str(message))
+    console.write(bcolors.GREEN + bcolors.BOLD + "[*] " + bcolors.ENDC + str(message) + "\n")
 
 def print_info(message):
-    print(bcolors.BLUE + bcolors.BOLD + "[-] " + bcolors.ENDC + str(message))
+    console.write(bcolors.BLUE + bcolors.BOLD + "[-] " + bcolors.ENDC + str(message) + "\n")
 
 def print_info_spaces(message):
-    print(bcolors.BLUE + bcolors.BOLD + "  [-] " + bcolors.ENDC + str(message))
+    console.write(bcolors.BLUE + bcolors.BOLD + "  [-] " + bcolors.ENDC + str(message) + "\n")
 
 def print_warning(message):
-    print(bcolors.YELLOW + bcolors.BOLD + "[!] " + bcolors.ENDC + str(message))
+    console.write(bcolors.YELLOW + bcolors.BOLD + "[!] " + bcolors.ENDC + str(message) + "\n")
 
 def print_error(message):
-    print(bcolors.RED + bcolors.BOLD + "[!] " + bcolors.ENDC + bcolors.RED + str(message) + bcolors.ENDC)
+    console.write(bcolors.RED + bcolors.BOLD + "[!] " + bcolors.ENDC + bcolors.RED + str(message) + bcolors.ENDC + "\n")
 
 
+_version_cache = None
+
 def get_version():
-    define_version = open("src/core/mksec.version", "r").read().rstrip()
-    # define_version = '1.0.0'
-    return define_version
+    # re-read only when mksec.version changes (e.g. after an update)
+    global _version_cache
+    path = "src/core/mksec.version"
+    mtime = os.stat(path).st_mtime_ns
+    if _version_cache is None or _version_cache[0] != mtime:
+        define_version = open(path, "r").read().rstrip()
+        # define_version = '1.0.0'
+        _version_cache = (mtime, define_version)
+    return _version_cache[1]
+
+def render_menu(text, menu):
+    lines = [text]
+    for i, option in enumerate(menu):
+        menunum = i + 1
+        # Check to see if this line has the 'return to main menu' code
+        # If it's not the return to menu line:
+        if "0D" not in option:
+            if menunum < 10:
+                lines.append('   %s) %s' % (menunum, option))
+            else:
+                lines.append('  %s) %s' % (menunum, option))
+        else:
+            lines.append('\n  99) Return to Main Menu\n')
+    return "\n".join(lines) + "\n"
 
 class create_menu:
 
     def __init__(self, text, menu):
         self.text = text
         self.menu = menu
-        print(text)
-        for i, option in enumerate(menu):
-
-            menunum = i + 1
-            # Check to see if this line has the 'return to main menu' code
-            match = re.search("0D", option)
-            # If it's not the return to menu line:
-            if not match:
-                if menunum < 10:
-                    print(('   %s) %s' % (menunum, option)))
-                else:
-                    print(('  %s) %s' % (menunum, option)))
-            else:
-                print('\n  99) Return to Main Menu\n')
+        # rendered once per menu, terminal size and color mode
+        renderer.write(renderer.frame(("menu", text, tuple(menu)),
+                                      lambda: render_menu(text, menu), bcolors.ENDC))
         return
 
 #ifconfig
 
 def detect_public_ip():
     """
-    Helper function to auto-detect our public IP(v4) address.
+    Helper function to auto-detect our public IP(v4) address, the one on
+    the egress interface. Read from the routing table, no DNS involved.
     """
-    rhost = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    rhost.connect(('google.com', 0))
-    rhost.settimeout(2)
-    return rhost.getsockname()[0]
+    from src.core import netinfo
+    address = netinfo.local_address()
+    if address is None:
+        raise OSError("no IPv4 address found on the egress interface")
+    return address
+
+# ask for the listener address, offering the detected one as the default
+
+def grab_ipaddress():
+    try:
+        revipaddr = detect_public_ip()
+    except Exception as error:
+        log(error)
+        revipaddr = ""
+    if revipaddr:
+        text = "IP address or URL (www.ex.com) for the payload listener (LHOST) [%s]" % revipaddr
+    else:
+        text = "Enter your interface/reverse listener IP Address or URL"
+    while True:
+        rhost = ip_prompt("0", text)
+        if rhost == "" and revipaddr:
+            return revipaddr
+        if rhost != "":
+            return rhost
 
 def validate_ip(address):
     """
     Validates that a given string is an IPv4 dotted quad.
     """
-    try:
-        if socket.inet_aton(address):
-            if len(address.split('.')) == 4:
-                debug_msg("core_mksec", "this is a valid IP address", 5)
-                return True
-            else:
-                print_error("This is not a valid IP address...")
-                raise socket.error
-
-        else:
-            raise socket_error
-
-    except socket.error:
-        return False
+    from src.core import ip_validation
+    if ip_validation.is_dotted_quad(address):
+        debug_msg("core_mksec", "this is a valid IP address", 5)
+        return True
+    if ip_validation.is_inet_aton(address):
+        # legal shorthand such as 10.1, but we want all four octets
+        print_error("This is not a valid IP address...")
+    return False
 
 #####config duzenlemek icin kullanilabilecek 2 kod parcasi
     # # this is an option if we don't want to use Metasploit period
@@ -323,45 +338,53 @@ def validate_ip(address):
 
 # update mksec
 
+# seconds we give each git step of an update
+UPDATE_TIMEOUT = 600
+
 def update_set():
-    backbox = check_backbox()
-    kali = check_kali()
-
-    if backbox == "BackBox":
-        # print_status("You are running BackBox Linux which already implements MKSEC updates.") maybe :(
-        # print_status("No need for further operations, just update your system.")
-        # time.sleep(2)
-        print_info("Kali or BackBox Linux not detected, manually updating...")
-        print_info("Updating the MKSEC, be patient...")
-        print_info("Performing cleanup first...")
-        subprocess.Popen("git clean -fd", shell=True).wait()
-        print_info("Updating... This could take a little bit...")
-        subprocess.Popen("git pull", shell=True).wait()
-        print_status("The updating has finished, returning to main menu...")
-        time.sleep(2)
-
-    elif kali == "Kali":
-        # print_status("You are running Kali Linux which maintains MKSEC updates.")
-        # time.sleep(2)
-        print_info("Kali or BackBox Linux not detected, manually updating...")
-        print_info("Updating the MKSEC, be patient...")
-        print_info("Performing cleanup first...")
-        subprocess.Popen("git clean -fd", shell=True).wait()
-        print_info("Updating... This could take a little bit...")
-        subprocess.Popen("git pull", shell=True).wait()
-        print_status("The updating has finished, returning to main menu...")
-        time.sleep(2)
-
-    # if we aren't running Kali or BackBox :(
-    else:
-        print_info("Kali or BackBox Linux not detected, manually updating...")
-        print_info("Updating the MKSEC, be patient...")
-        print_info("Performing cleanup first...")
-        subprocess.Popen("git clean -fd", shell=True).wait()
-        print_info("Updating... This could take a little bit...")
-        subprocess.Popen("git pull", shell=True).wait()
-        print_status("The updating has finished, returning to main menu...")
-        time.sleep(2)
+    # git runs as a background job, the menus stay usable meanwhile
+    from src.core import jobs
+    if jobs.find("update") is not None:
+        print_warning("An update is already running, type 'jobs' at the main menu to follow it.")
+        return
+    print_info("Kali or BackBox Linux not detected, manually updating...")
+    job = jobs.submit_commands("update", [["git", "clean", "-fd"], ["git", "pull"]], timeout=UPDATE_TIMEOUT)
+    # a git pull killed halfway leaves the checkout mid merge
+    job.interruptible = False
+    print_status("Updating the MKSEC in the background, type 'jobs' at the main menu to follow it.")
+
+# start apache in the background unless it is already being started
+
+def start_apache():
+    from src.core import jobs
+    if jobs.find("apache2") is None:
+        jobs.submit_command("apache2", ["service", "apache2", "start"], timeout=60)
+
+# list the background jobs and let the operator cancel one
+
+def jobs_menu():
+    from src.core import jobs
+    while 1:
+        listing = jobs.jobs()
+        if not listing:
+            print_info("No background jobs.")
+            return
+        print("")
+        for job in listing:
+            print("  " + job.describe())
+        print("")
+        choice = raw_input(setprompt("0", "Job number to cancel, <return> to go back")).strip()
+        if choice == "":
+            return
+        try:
+            job_id = int(choice)
+        except ValueError:
+            print_warning("%s is not a job number." % choice)
+            continue
+        if jobs.cancel(job_id):
+            print_status("Cancelling job %d..." % job_id)
+        else:
+            print_warning("Job %d is not running." % job_id)
 
 # pull the help menu here
 
@@ -391,96 +414,74 @@ def windows_root():
 # core log file routine for MKSEC
 
 def log(error):
+    # queued to the background writer in src/core/logger.py, never blocks on disk
     try:
-        # open log file only if directory is present (may be out of directory
-        # for some reason)
-        if not os.path.isfile("%s/src/logs/set_logfile.log" % (definepath())):
-            filewrite = open("%s/src/logs/set_logfile.log" %
-                             (definepath()), "w")
-            filewrite.write("")
-            filewrite.close()
-        if os.path.isfile("%s/src/logs/set_logfile.log" % (definepath())):
-            error = str(error)
-            # open file for writing
-            filewrite = open("%s/src/logs/set_logfile.log" %
-                             (definepath()), "a")
-            # write error message out
-            filewrite.write("ERROR: " + date_time() + ": " + error + "\n")
-            # close the file
-            filewrite.close()
-    except IOError as err:
+        from src.core import logger
+        fields = {}
+        if isinstance(error, BaseException):
+            fields["error_type"] = type(error).__name__
+        logger.error(error, module=sys._getframe(1).f_globals.get("__name__"), **fields)
+    except Exception:
         pass
 
 #show banner
 def show_banner(define_version, graphic):
-    if graphic == "1":
-        if check_os() == "posix":
-            os.system("clear")
-        if check_os() == "windows":
-            os.system("cls")
-        show_graphic()
+    # the whole banner goes out as one frame
+    if check_os() == "posix":
+        parts = [renderer.CLEAR_SEQUENCE]
     else:
-        os.system("clear")
+        renderer.clear()
+        parts = []
+    if graphic == "1":
+        parts.append(show_graphic(render=False))
 
-    print(bcolors.BLUE + """
-        [ mksec """ + "v%s" % (define_version) + """ ]""")
+    parts.append(bcolors.BLUE + """
+        [ mksec """ + "v%s" % (define_version) + """ ]\n""")
 
     # here we check if there is a new version of MKSEC - if there is, then
-    # display a banner
+    # display a banner. the check runs in the background at most once per
+    # VERSION_CHECK_TTL, so the banner only ever reads the cached answer
+    from src.core import version_check
     cv = get_version()
 
-    # pull version
     try:
-        version = ""
+        version_check.start_check()
+        version = version_check.latest_version()
+        if version != "" and cv != version:
+            parts.append(bcolors.RED + "          There is a new version of MKSEC available.\n                    " + bcolors.GREEN + " Your version: " + bcolors.RED + cv + bcolors.GREEN +
+                         "\n                  Current version: " + bcolors.ENDC + version + bcolors.YELLOW + "\nPlease update MKSEC to the latest before submitting any git issues.\n" + bcolors.ENDC + "\n")
+        elif version == "" and version_check.last_error() is not None:
+            parts.append(
+                bcolors.RED + " Unable to check for new version of MKSEC (is your network up?)\n" + bcolors.ENDC + "\n")
 
-        def pull_version():
-            if not os.path.isfile(userconfigpath + "version.lock"):
-                try:
+    except Exception as err:
+        parts.append(str(err) + "\n")
+        # pass
 
-                    url = (
-                        'https://raw.githubusercontent.com/generatorexit/mksec/main/src/core/mksec.version')
-                    version = urlopen(url).read().rstrip().decode('utf-8')
-                    filewrite = open(userconfigpath + "version.lock", "w")
-                    filewrite.write(version)
-                    filewrite.close()
+    # what the background jobs are up to, and what finished since last time
+    if "src.core.jobs" in sys.modules:
+        for line in sys.modules["src.core.jobs"].status_lines():
+            parts.append(bcolors.YELLOW + "  [jobs] " + line + bcolors.ENDC + "\n")
 
-                except KeyboardInterrupt:
-                    version = "keyboard interrupt"
+    renderer.write(*parts)
 
-            else:
-                version = open(userconfigpath + "version.lock", "r").read()
-
-            if cv != version:
-                if version != "":
-                    print(bcolors.RED + "          There is a new version of MKSEC available.\n                    " + bcolors.GREEN + " Your version: " + bcolors.RED + cv + bcolors.GREEN +
-                          "\n                  Current version: " + bcolors.ENDC + version + bcolors.YELLOW + "\nPlease update MKSEC to the latest before submitting any git issues.\n" + bcolors.ENDC)
-
-        # why urllib and sockets cant control DNS resolvers is beyond me - so
-        # we use this as a hack job to add a delay and kill if updates are
-        # taking too long
-        p = multiprocessing.Process(target=pull_version)
-        p.start()
-
-        # Wait for 5 seconds or until process finishes
-        p.join(8)
-
-        # If thread is still active
-        if p.is_alive():
-            print(
-                bcolors.RED + " Unable to check for new version of MKSEC (is your network up?)\n" + bcolors.ENDC)
-            # terminate the process
-            p.terminate()
-            p.join()
 
-    except Exception as err:
-        print(err)
-        # pass
+def show_graphic(render=True):
+    import random
+    menu = random.randrange(1, 14)
+    # each piece of art is only assembled once
+    art = renderer.frame(("graphic", menu), lambda: graphic_art(menu) + "\n", bcolors.ENDC)
+    if render:
+        renderer.write(art)
+    return art
 
 
-def show_graphic():
-    menu = random.randrange(1, 14)
+def graphic_art(menu):
+    """
+    Art number menu (1-13) of the startup banner, as one string.
+    """
     if menu == 1:
-        print(bcolors.YELLOW + r"""
+        return (bcolors.YELLOW + r"""
         0111100101101111011101010010000001110010
         0110010101100001011011000110110001111001
         0010000001101000011000010111011001100101
@@ -497,10 +498,9 @@ def show_graphic():
         0110010100100000011011010110101101110011
         0110010101100011001011100010000000101010
         0110100001110101011001110111001100101010""" + bcolors.ENDC)
-        return
 
     if menu == 2:
-        print("""\x1b[36m
+        return ("""\x1b[36m
         .##.....##.##....##..######..########..######.
         .###...###.##...##..##....##.##.......##....##
         .####.####.##..##...##.......##.......##......
@@ -508,10 +508,9 @@ def show_graphic():
         .##.....##.##..##.........##.##.......##......
         .##.....##.##...##..##....##.##.......##....##
         .##.....##.##....##..######..########..######.""" + bcolors.ENDC)
-        return
 
     if menu == 3:
-        print("""\x1b[36m
+        return ("""\x1b[36m
         ##::::'##:'##:::'##::'######::'########::'######::
         ###::'###: ##::'##::'##... ##: ##.....::'##... ##:
         ####'####: ##:'##::: ##:::..:: ##::::::: ##:::..::
@@ -522,7 +521,7 @@ def show_graphic():
         ..:::::..::..::::..:::......:::........:::......::""" + bcolors.ENDC)
 
     if menu == 4:
-        print(bcolors.RED + """
+        return (bcolors.RED + """
                    ,   ,
                  ,-`{-`/
               ,-~ , \ {-~~-,
@@ -545,10 +544,9 @@ def show_graphic():
             \x1b[37m/ , ~ . ~ \ , ` .  ^  `  , . ^   .   , ` .`-,___,---,__            \x1b[32m``\x1b[31m
            \x1b[37m/` ` . ~ . ` `\ `  ~  ,  .  ,  `  ,  . ~  ^  ,  .  ~  , .`~---,___
          \x1b[37m/` . `  ,  . ~ , \  `  ~  ,  .  ^  ,  ~  .  `  ,  ~  .  ^  ,  ~  .  `-,""" + bcolors.ENDC)
-        return
 
     if menu == 5:
-        print("""\x1b[33m
+        return ("""\x1b[33m
                                       A
                                      /_\\
                              :      /_|_\\
@@ -562,10 +560,9 @@ def show_graphic():
         ::::::::::::::.:..:./___|___|___|___|___\....................
                 .........../..!...!...!...!...!..\...............
                                   \x1b[36m \x1b[5m-mksec-  \x1b[0m""" + bcolors.ENDC)
-        return
 
     if menu == 6:
-        print("""\x1b[33m
+        return ("""\x1b[33m
                                 /\\
           \x1b[36m___                  \x1b[33m/  \                  \x1b[36m___
          \x1b[36m/   \     __         \x1b[33m/    \         \x1b[36m__     /
@@ -582,10 +579,9 @@ def show_graphic():
                    /__I___I___I___I___I___I___\\
                   /_I___I___I___I___I___I___I__\\
                             \x1b[36m \x1b[5m-mksec-  \x1b[0m""" + bcolors.ENDC)
-        return
 
     if menu == 7:
-        print('''\x1b[31m
+        return ('''\x1b[31m
         ILOVEYOUILOVEYOUILOVEYOUILOVEYOUILOVEYOUILO
         ILOVEYOUILO \x1b[37m****** \x1b[31mVEYOU \x1b[37m****** \x1b[31mILOVEYOUILO
         ILOVEYOU \x1b[37m*********** \x1b[31mI \x1b[37m*********** \x1b[31mLOVEYOUI
@@ -609,7 +605,7 @@ def show_graphic():
         OVEYOUILOVEYOUILOVEYOUILOVEYOUILOVEYOUILOVE'''+ bcolors.ENDC)
 
     if menu == 8:
-        print("""\x1b[37m
+        return ("""\x1b[37m
         888888888888888888888888888888888888888888888888888888888888
         888888888888888888888888888888888888888888888888888888888888
         8888888888888888888888888P""  ""9888888888888888888888888888
@@ -626,7 +622,7 @@ def show_graphic():
         888888888888888888888888888888888888888888888888888888888888""" + bcolors.ENDC)
 
     if menu == 9:
-        print("""\x1b[33m
+        return ("""\x1b[33m
                         .,aadd"'    `"bbaa,.
                     ,ad8888P'          `Y8888ba,
                  ,a88888888    \x1b[36m\x1b[5mmksec\x1b[0m\x1b[33m     88888888a,
@@ -653,7 +649,7 @@ def show_graphic():
                         ``""YYbbaaaaddPP""''""" + bcolors.ENDC)
 
     if menu == 10:
-        print("""\x1b[33m
+        return ("""\x1b[33m
                                             \  /
                                             (())
                                             ,~L_
@@ -672,7 +668,7 @@ def show_graphic():
                                         \_\_______________\_"_?"""+ bcolors.ENDC)
 
     if menu == 11:
-        print('''\x1b[33m
+        return ('''\x1b[33m
                                       /^\\
                    \x1b[35mL L               \x1b[33m/   \               \x1b[35mL L
                 __/|/|_             \x1b[33m/  .  \             \x1b[35m_|\|\__
@@ -692,7 +688,7 @@ def show_graphic():
 '''+ bcolors.ENDC)
 
     if menu == 12:
-        print("""\x1b[33m
+        return ("""\x1b[33m
 
 
                                                     \x1b[37m ___
@@ -718,7 +714,7 @@ def show_graphic():
         \x1b[37m."""+ bcolors.ENDC)
 
     if menu == 13:
-        print("""\x1b[31m
+        return ("""\x1b[31m
                         ..:::::::::..
                    ..:::\x1b[37maad8888888baa\x1b[31m:::..
                 .::::\x1b[37md:?88888888888?::8b\x1b[31m::::.
@@ -744,16 +740,12 @@ def show_graphic():
 # identify if set interactive shells are disabled
 
 def set_check():
-    fileopen = open("/etc/setoolkit/set.config", "r")
-    for line in fileopen:
-        match = re.search("SET_INTERACTIVE_SHELL=OFF", line)
-        # if we turned it off then we return a true else return false
-        if match:
-            return True
-        match1 = re.search("SET_INTERACTIVE_SHELL=ON", line)
-        # return false otherwise
-        if match1:
-            return False
+    value = config.get("SET_INTERACTIVE_SHELL")
+    # if we turned it off then we return a true else return false
+    if value == "OFF":
+        return True
+    if value == "ON":
+        return False
 
 # if the user specifies 99
 
@@ -782,175 +774,100 @@ def check_length(choice, max):
         except Exception:
             counter = 1
 
-# valid if IP address is legit
+# valid if IP address is legit, the patterns live in src/core/ip_validation.py
+# and are compiled once, on the first call
 
 def is_valid_ip(ip):
-    return is_valid_ipv4(ip) or is_valid_ipv6(ip)
+    from src.core import ip_validation
+    return ip_validation.is_valid_ip(ip)
 
 # ipv4
 
 def is_valid_ipv4(ip):
-    pattern = re.compile(r"""
-        ^
-        (?:
-          # Dotted variants:
-          (?:
-            # Decimal 1-255 (no leading 0's)
-            [3-9]\d?|2(?:5[0-5]|[0-4]?\d)?|1\d{0,2}
-          |
-            0x0*[0-9a-f]{1,2}  # Hexadecimal 0x0 - 0xFF (possible leading 0's)
-          |
-            0+[1-3]?[0-7]{0,2} # Octal 0 - 0377 (possible leading 0's)
-          )
-          (?:                  # Repeat 0-3 times, separated by a dot
-            \.
-            (?:
-              [3-9]\d?|2(?:5[0-5]|[0-4]?\d)?|1\d{0,2}
-            |
-              0x0*[0-9a-f]{1,2}
-            |
-              0+[1-3]?[0-7]{0,2}
-            )
-          ){0,3}
-        |
-          0x0*[0-9a-f]{1,8}    # Hexadecimal notation, 0x0 - 0xffffffff
-        |
-          0+[0-3]?[0-7]{0,10}  # Octal notation, 0 - 037777777777
-        |
-          # Decimal notation, 1-4294967295:
-          429496729[0-5]|42949672[0-8]\d|4294967[01]\d\d|429496[0-6]\d{3}|
-          42949[0-5]\d{4}|4294[0-8]\d{5}|429[0-3]\d{6}|42[0-8]\d{7}|
-          4[01]\d{8}|[1-3]\d{0,9}|[4-9]\d{0,8}
-        )
-        $
-    """, re.VERBOSE | re.IGNORECASE)
-    return pattern.match(ip) is not None
+    from src.core import ip_validation
+    return ip_validation.is_valid_ipv4(ip)
 
 # ipv6
 
 def is_valid_ipv6(ip):
     """Validates IPv6 addresses.
     """
-    pattern = re.compile(r"""
-        ^
-        \s*                         # Leading whitespace
-        (?!.*::.*::)                # Only a single whildcard allowed
-        (?:(?!:)|:(?=:))            # Colon iff it would be part of a wildcard
-        (?:                         # Repeat 6 times:
-            [0-9a-f]{0,4}           # A group of at most four hexadecimal digits
-            (?:(?<=::)|(?<!::):)    # Colon unless preceeded by wildcard
-        ){6}                        #
-        (?:                         # Either
-            [0-9a-f]{0,4}           # Another group
-            (?:(?<=::)|(?<!::):)    # Colon unless preceeded by wildcard
-            [0-9a-f]{0,4}           # Last group
-            (?: (?<=::)             # Colon iff preceeded by exacly one colon
-             |  (?<!:)              #
-             |  (?<=:) (?<!::) :    #
-             )                      # OR
-         |                          # A v4 address with NO leading zeros
-            (?:25[0-4]|2[0-4]\d|1\d\d|[1-9]?\d)
-            (?: \.
-                (?:25[0-4]|2[0-4]\d|1\d\d|[1-9]?\d)
-            ){3}
-        )
-        \s*                         # Trailing whitespace
-        $
-    """, re.VERBOSE | re.IGNORECASE | re.DOTALL)
-    return pattern.match(ip) is not None
+    from src.core import ip_validation
+    return ip_validation.is_valid_ipv6(ip)
+
+# batch validation of address lists, one IPResult per entry
+
+def validate_ips(entries):
+    from src.core import ip_validation
+    return ip_validation.validate_many(entries)
 
 # check the config file and return value
 def check_config(param):
-    fileopen = open("/etc/setoolkit/set.config", "r")
-    for line in fileopen:
-        line = line.rstrip()
-        # print line
-        # if the line starts with the param we want then we are set, otherwise
-        # if it starts with a # then ignore
-        if line.startswith(param) != "#":
-            if line.startswith(param):
-                line = line.rstrip()
-                # remove any quotes or single quotes
-                line = line.replace('"', "")
-                line = line.replace("'", "")
-                line = line.split("=", 1)
-                return line[1]
+    # served from the shared index, which re-reads set.config only when it changes
+    return config.get(param)
 
 # copy an entire folder function
 
 def copyfolder(sourcePath, destPath):
-    for root, dirs, files in os.walk(sourcePath):
-
-        # figure out where we're going
-        dest = destPath + root.replace(sourcePath, '')
-
-        # if we're in a directory that doesn't exist in the destination folder
-        # then create a new folder
-        if not os.path.isdir(dest):
-            os.mkdir(dest)
-
-        # loop through all files in the directory
-        for f in files:
-
-            # compute current (old) & new file locations
-            oldLoc = root + '/' + f
-            newLoc = dest + '/' + f
-
-            if not os.path.isfile(newLoc):
-                try:
-                    shutil.copy2(oldLoc, newLoc)
-                except IOError:
-                    pass
+    # missing and changed files are copied in parallel, unchanged ones skipped
+    from src.core import tree_sync
+    from src.core import logger
+    report = tree_sync.sync(sourcePath, destPath)
+    debug_msg("core_mksec", "copyfolder %s: %s", 3, sourcePath, report)
+    logger.info("copyfolder %s -> %s" % (sourcePath, destPath), **report.as_dict())
+    return report
 
 
 # this routine will be used to check config options within the set.options
 
 def check_options(option):
-        # open the directory
-    trigger = 0
-    if os.path.isfile(userconfigpath + "set.options"):
-        fileopen = open(userconfigpath + "set.options", "r").readlines()
-        for line in fileopen:
-            match = re.search(option, line)
-            if match:
-                line = line.rstrip()
-                line = line.replace('"', "")
-                line = line.split("=")
-                return line[1]
-                trigger = 1
-
-    if trigger == 0:
-        return trigger
+    # exact key lookup against the in-memory session store, 0 if unset
+    value = session.get(option)
+    if value is None:
+        return 0
+    return value
 
 # future home to update one localized set configuration file
 
 def update_options(option):
-        # if the file isn't there write a blank file
-    if not os.path.isfile(userconfigpath + "set.options"):
-        filewrite = open(userconfigpath + "set.options", "w")
-        filewrite.write("")
-        filewrite.close()
-
-    # remove old options
-    fileopen = open(userconfigpath + "set.options", "r")
-    old_options = ""
-    for line in fileopen:
-        match = re.search(option, line)
-        if match:
-            line = ""
-        old_options = old_options + line
-    # append to file
-    filewrite = open(userconfigpath + "set.options", "w")
-    filewrite.write(old_options + "\n" + option + "\n")
-    filewrite.close()
+    # appends a single KEY=VALUE record to the set.options journal
+    session.update(option)
 
 # exit routine
 
 def exit_mksec():
     print("\n\n[*] Exiting the mksec")
+    stop_jobs()
+    # flush anything still queued for the log file before we go
+    if "src.core.logger" in sys.modules:
+        sys.modules["src.core.logger"].shutdown()
     sys.exit()
 
 
+# cancel whatever still runs in the background before leaving. jobs that
+# must not be interrupted (an update) are waited for, control-c asks first
+
+def stop_jobs():
+    if "src.core.jobs" not in sys.modules:
+        return
+    jobs = sys.modules["src.core.jobs"]
+    for job in jobs.uninterruptible():
+        print_status("Waiting for background job %s to finish, press control-c to stop it..." % job.name)
+        while job.active:
+            try:
+                job.wait(0.5)
+            except KeyboardInterrupt:
+                try:
+                    answer = raw_input("\n[!] Stopping %s now can leave it half done. Stop it anyway? [y/N] " % job.name)
+                except (KeyboardInterrupt, EOFError):
+                    answer = "y"
+                if answer.strip().lower() in ("y", "yes"):
+                    job.cancel()
+                    break
+    for job in jobs.shutdown():
+        print_warning("Background job %s did not stop in time." % job.name)
+
+
 # compare ports to make sure its not already in a config file for metasploit
 
 # def check_ports(filename, port):
@@ -973,6 +890,16 @@ def setdir():
 # set the main directory for MKSEC
 userconfigpath = setdir()
 
+# session options (set.options) and the small per-session state files
+session = SessionStore(os.path.join(userconfigpath, "set.options"))
+
+def refresh_userconfigpath():
+    # for a process whose HOME changed after import (a warm daemon session)
+    global userconfigpath, session
+    session.close()
+    userconfigpath = setdir()
+    session = SessionStore(os.path.join(userconfigpath, "set.options"))
+
 # capture output from a function
 
 def capture(func, *args, **kwargs):
@@ -980,47 +907,32 @@ def capture(func, *args, **kwargs):
     The function output includes any exception raised. capture returns
     a tuple of (function result, standard output, standard error).
     """
-    stdout, stderr = sys.stdout, sys.stderr
-    sys.stdout = c1 = io.StringIO()
-    sys.stderr = c2 = io.StringIO()
+    import traceback
     result = None
-    try:
-        result = func(*args, **kwargs)
-    except:
-        traceback.print_exc()
-    sys.stdout = stdout
-    sys.stderr = stderr
-    return (result, c1.getvalue(), c2.getvalue())
+    # recorded by the console, sys.stdout and sys.stderr stay in place
+    with console.capture("stdout") as out, console.capture("stderr") as err:
+        try:
+            result = func(*args, **kwargs)
+        except:
+            traceback.print_exc()
+    return (result, out.getvalue(), err.getvalue())
 
 # check to see if we are running backbox linux
 
 def check_backbox():
-    if os.path.isfile("/etc/issue"):
-        backbox = open("/etc/issue", "r")
-        backboxdata = backbox.read()
-        if "BackBox" in backboxdata:
-            return "BackBox"
-        # if we aren't running backbox
-        else:
-            return "Non-BackBox"
-    else:
+    # probed once per session by src/core/capabilities.py
+    host = capabilities.host()
+    if not host.debian:
         print("[!] Not running a Debian variant..")
-        return "Non-BackBox"
+    return "BackBox" if host.distro == "BackBox" else "Non-BackBox"
 
 # check to see if we are running kali linux
 
 def check_kali():
-    if os.path.isfile("/etc/apt/sources.list"):
-        kali = open("/etc/apt/sources.list", "r")
-        kalidata = kali.read()
-        if "kali" in kalidata:
-            return "Kali"
-        # if we aren't running kali
-        else:
-            return "Non-Kali"
-    else:
+    host = capabilities.host()
+    if not host.debian:
         print("[!] Not running a Debian variant..")
-        return "Non-Kali"
+    return "Kali" if host.distro == "Kali" else "Non-Kali"
 
 # reload module function for python 2 and python 3
 
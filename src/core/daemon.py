@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+#
+# Warm daemon for MKSEC (setoolkit --daemon)
+#
+# The daemon imports the core, checks set.config and scans the third party
+# modules once, then waits on a Unix socket. A launch that finds it running
+# becomes a thin client: it hands its terminal (file descriptors 0-2), its
+# working directory, arguments and environment to the daemon and waits.
+# The daemon forks a session for it which takes over the terminal and runs
+# setoolkit with everything already loaded, so the menu shows up at once.
+#
+# Signals the client gets (control-c ...) are relayed to its session, and
+# the session's exit status comes back as the client's own. set.config is
+# re-checked by every session as usual; when MKSEC's own source changes
+# (an update) the daemon turns new clients away, so they start normally,
+# and restarts itself as soon as its last session has ended.
+#
+# The socket lives in SOCKET_DIR, owned by root with mode 0600, and peers
+# are checked with SO_PEERCRED on top of that.
+#
+import os
+import sys
+
+SOCKET_DIR = "/run/mksec"
+SOCKET_PATH = os.path.join(SOCKET_DIR, "mksec.sock")
+
+FLAG = "--daemon"
+# start a fresh MKSEC even though a daemon is running
+NO_DAEMON_FLAG = "--no-daemon"
+ENV_NO_DAEMON = "MKSEC_NO_DAEMON"
+
+# seconds between checks for finished sessions
+POLL_INTERVAL = 0.2
+
+# seconds a client gets to send its request
+HANDSHAKE_TIMEOUT = 5
+
+# largest request (arguments and environment) accepted, in bytes
+MAX_REQUEST = 1024 * 1024
+
+# signals a client passes on to its session
+RELAYED_SIGNALS = ("SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT", "SIGWINCH")
+
+# modules a session is likely to need, imported before the first fork
+PRELOAD = [
+    "json",
+    "random",
+    "socket",
+    "subprocess",
+    "urllib.request",
+    "src.core.core_mksec",
+    "src.core.menu.text",
+    "src.core.update_config",
+    "src.core.module_registry",
+]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# set in a forked session, which must never attach to the daemon itself
+_in_session = False
+
+
+class DaemonError(Exception):
+    """ Raised when the daemon cannot start. """
+
+
+def _log(level, message, **fields):
+    try:
+        from src.core import logger
+        getattr(logger, level)(message, "daemon", **fields)
+    except Exception:
+        pass
+
+
+#
+# client
+#
+
+def should_attach(argv=None):
+    """
+    True when this launch should hand over to a running daemon. Removes
+    --no-daemon from argv; --profile always runs locally so the session is
+    measured in this process.
+    """
+
+    argv = sys.argv if argv is None else argv
+    if NO_DAEMON_FLAG in argv:
+        argv.remove(NO_DAEMON_FLAG)
+        return False
+    if _in_session or os.environ.get(ENV_NO_DAEMON, "") not in ("", "0"):
+        return False
+    if "--profile" in argv or os.environ.get("MKSEC_PROFILE", "") not in ("", "0"):
+        return False
+    return os.path.exists(SOCKET_PATH)
+
+
+def attach(args, path=SOCKET_PATH):
+    """
+    Runs a session in the daemon on this terminal. Returns its exit status,
+    or None when no daemon took the request (start locally then).
+    """
+
+    import json
+    import signal
+    import socket
+    import struct
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        request = json.dumps({"cwd": os.getcwd(), "argv": list(args),
+                              "env": dict(os.environ)}).encode("utf-8")
+        message = struct.pack("!I", len(request)) + request
+        sent = socket.send_fds(client, [message], [0, 1, 2])
+        client.sendall(message[sent:])
+    except (OSError, ValueError):
+        client.close()
+        return None
+
+    def relay(signum, frame):
+        try:
+            client.sendall(b"S%d\n" % signum)
+        except OSError:
+            pass
+
+    previous = {}
+    for name in RELAYED_SIGNALS:
+        number = getattr(signal, name, None)
+        if number is not None:
+            previous[number] = signal.signal(number, relay)
+    # the session owns the terminal now, suspending only this client would
+    # leave it reading from a shell prompt
+    if hasattr(signal, "SIGTSTP"):
+        previous[signal.SIGTSTP] = signal.signal(signal.SIGTSTP, signal.SIG_IGN)
+
+    status = 1
+    try:
+        buffered = b""
+        while b"\n" not in buffered:
+            data = client.recv(64)
+            if not data:
+                break
+            buffered += data
+        line = buffered.split(b"\n", 1)[0]
+        if line == b"R":
+            # the daemon is restarting, run this one locally
+            status = None
+        elif line.startswith(b"X"):
+            status = int(line[1:])
+    finally:
+        for number, handler in previous.items():
+            signal.signal(number, handler)
+        client.close()
+    return status
+
+
+#
+# daemon
+#
+
+def _peer_uid(conn):
+    import socket
+    import struct
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)[1]
+
+
+def _source_signatures():
+    # mtimes of every loaded MKSEC source file, to notice an update
+    signatures = {}
+    files = [os.path.join(ROOT, "setoolkit")]
+    for module in list(sys.modules.values()):
+        filename = getattr(module, "__file__", None)
+        if filename and filename.startswith(ROOT + os.sep):
+            files.append(filename)
+    for filename in files:
+        try:
+            signatures[filename] = os.stat(filename).st_mtime_ns
+        except OSError:
+            signatures[filename] = None
+    return signatures
+
+
+def _stale(signatures):
+    for filename, mtime in signatures.items():
+        try:
+            current = os.stat(filename).st_mtime_ns
+        except OSError:
+            current = None
+        if current != mtime:
+            return True
+    return False
+
+
+def preload():
+    """ Imports PRELOAD and warms the config and module caches. """
+
+    import importlib
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError as error:
+            _log("warning", "could not preload %s: %s" % (name, error))
+    from src.core.config_store import config
+    from src.core.module_registry import registry
+    from src.core.update_config import update_config
+    # a missing set.config is left to the first session's bootstrap
+    if os.path.isfile(config.path):
+        config.refresh()
+        update_config()
+    registry.scan()
+
+
+def _read_request(conn):
+    import json
+    import socket
+    import struct
+
+    conn.settimeout(HANDSHAKE_TIMEOUT)
+    data, fds, flags, address = socket.recv_fds(conn, 65536, 3)
+    try:
+        if len(fds) != 3 or len(data) < 4:
+            raise ValueError("expected a header and three file descriptors")
+        size = struct.unpack("!I", data[:4])[0]
+        if size > MAX_REQUEST:
+            raise ValueError("request of %d bytes is too large" % size)
+        data = data[4:]
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ValueError("client went away during the request")
+            data += chunk
+        request = json.loads(data.decode("utf-8"))
+    except Exception:
+        for fd in fds:
+            os.close(fd)
+        raise
+    conn.settimeout(None)
+    return request, fds
+
+
+def _relay(conn):
+    # passes the signals the client relays on to this session; when the
+    # client goes away the terminal went with it
+    import signal
+    buffered = b""
+    while True:
+        try:
+            data = conn.recv(256)
+        except OSError:
+            data = b""
+        if not data:
+            os.kill(os.getpid(), signal.SIGHUP)
+            return
+        buffered += data
+        while b"\n" in buffered:
+            line, buffered = buffered.split(b"\n", 1)
+            if line.startswith(b"S") and line[1:].isdigit():
+                os.kill(os.getpid(), int(line[1:]))
+
+
+def _refresh_environment():
+    # what the preloaded core took from the daemon's environment (the trace
+    # level, ~/.set and set.options) is worked out again for the client's
+    from src.core import core_mksec
+    from src.core import trace
+    trace.configure()
+    core_mksec.refresh_userconfigpath()
+
+
+def _run_session(conn):
+    # runs in the forked child and never returns
+    global _in_session
+    import signal
+    import threading
+    _in_session = True
+    status = 1
+    try:
+        for name in ("SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT", "SIGCHLD", "SIGWINCH", "SIGPIPE"):
+            number = getattr(signal, name, None)
+            if number is not None:
+                signal.signal(number, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        # the handshake happens here so a slow client only holds up itself
+        try:
+            request, fds = _read_request(conn)
+        except Exception as error:
+            _log("warning", "bad client request: %s" % error)
+            os._exit(1)
+
+        os.setsid()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            if fd > 2:
+                os.close(fd)
+        relay = threading.Thread(target=_relay, args=(conn,), name="mksec-relay")
+        relay.daemon = True
+        relay.start()
+
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        os.environ.clear()
+        os.environ.update(request.get("env", {}))
+        os.chdir(request.get("cwd", ROOT))
+        _refresh_environment()
+        _log("info", "session %d started" % os.getpid(), argv=request.get("argv", []))
+
+        import runpy
+        script = os.path.join(ROOT, "setoolkit")
+        sys.argv = [script] + list(request.get("argv", []))
+        try:
+            runpy.run_path(script, run_name="__main__")
+            status = 0
+        except SystemExit as exit:
+            if exit.code is None:
+                status = 0
+            elif isinstance(exit.code, int):
+                status = exit.code
+            else:
+                sys.stderr.write("%s\n" % exit.code)
+                status = 1
+        except KeyboardInterrupt:
+            status = 130
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(status)
+
+
+def _start_session(conn, inherited):
+    """
+    Forks a session for a new client, returns its pid or None. inherited
+    are the daemon's other sockets, closed in the session. The session
+    reads the client's request and relays its signals itself, the daemon
+    only sends the exit status back on conn.
+    """
+
+    try:
+        uid = _peer_uid(conn)
+    except OSError as error:
+        _log("warning", "could not check a client: %s" % error)
+        return None
+    if uid not in (0, os.geteuid()):
+        _log("warning", "refused a client running as uid %d" % uid)
+        return None
+
+    pid = os.fork()
+    if pid == 0:
+        for sock in inherited:
+            sock.close()
+        _run_session(conn)
+    return pid
+
+
+def _exit_status(status):
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _bind(path):
+    import socket
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    os.chmod(directory, 0o700)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            # left behind by a daemon that died
+            os.unlink(path)
+        else:
+            raise DaemonError("a daemon is already listening on %s" % path)
+        finally:
+            probe.close()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    os.chmod(path, 0o600)
+    server.listen(16)
+    return server
+
+
+def serve(path=SOCKET_PATH):
+    """
+    Runs the daemon in the foreground until SIGTERM or control-c. Restarts
+    itself in place after MKSEC's source changed and the sessions ended.
+    """
+
+    import select
+    import signal
+
+    if os.name != "posix" or not hasattr(os, "fork"):
+        raise DaemonError("the daemon needs a POSIX system")
+    if os.geteuid() != 0:
+        raise DaemonError("the daemon has to run as root, like MKSEC itself")
+
+    os.chdir(ROOT)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    preload()
+    signatures = _source_signatures()
+    server = _bind(path)
+    print("[*] MKSEC daemon listening on %s (pid %d)" % (path, os.getpid()))
+    _log("info", "daemon listening on %s" % path, pid=os.getpid())
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM, stop)
+
+    # session pid -> client connection
+    sessions = {}
+    restart = False
+    try:
+        while True:
+            if restart and not sessions:
+                break
+            if select.select([server], [], [], POLL_INTERVAL)[0]:
+                conn = server.accept()[0]
+                if restart or _stale(signatures):
+                    # new code on disk: this client starts locally,
+                    # the daemon restarts once it is idle
+                    restart = True
+                    conn.sendall(b"R\n")
+                    conn.close()
+                else:
+                    pid = _start_session(conn, [server] + list(sessions.values()))
+                    if pid is None:
+                        conn.close()
+                    else:
+                        sessions[pid] = conn
+            while sessions:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid == 0:
+                    break
+                conn = sessions.pop(pid, None)
+                if conn is None:
+                    continue
+                try:
+                    conn.sendall(b"X%d\n" % _exit_status(status))
+                except OSError:
+                    pass
+                conn.close()
+                _log("info", "session %d ended" % pid, status=_exit_status(status))
+    except KeyboardInterrupt:
+        restart = False
+        for pid in sessions:
+            _signal(pid, signal.SIGHUP)
+    finally:
+        server.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    if restart:
+        print("[*] MKSEC changed on disk, restarting the daemon")
+        _log("info", "restarting after an update")
+        from src.core import logger
+        logger.shutdown()
+        # the same command line that started this daemon, from ROOT
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    print("[*] MKSEC daemon stopped")
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except OSError:
+        pass
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#
+# Import manager for the MKSEC menus
+#
+# Most attack modules are scripts: importing them *is* the action, so the
+# menus used to append their directory to sys.path and then reload() or
+# import them on every selection. sys.path grew by one entry per choice and
+# each reload searched all of it again and re-read the module from disk.
+#
+# Here every search root is registered once, the location of a module is
+# looked up once and its code object is kept until the source file changes:
+#
+#   run(name, root)   executes the module again on every call (scripts)
+#   load(name, root)  imports once, re-executes only when the source changed
+#
+# stats() reports how many imports, runs, reloads and compiles happened.
+#
+import os
+import sys
+import threading
+
+from src.core import profiler
+
+_lock = threading.RLock()
+_roots = set()
+# (name, root) -> file name
+_locations = {}
+# file name -> ((mtime_ns, size), code)
+_code = {}
+# module name -> signature of the source it was last executed from
+_loaded = {}
+_counters = {"imports": 0, "runs": 0, "reloads": 0, "hits": 0, "compiles": 0}
+
+
+def add_root(path):
+    """
+    Puts path (relative to the MKSEC directory) on sys.path once and
+    returns it as an absolute path.
+    """
+
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _roots:
+            _roots.add(path)
+            if path not in sys.path:
+                sys.path.append(path)
+    return path
+
+
+def _locate(name, root):
+    key = (name, root)
+    filename = _locations.get(key)
+    if filename is not None:
+        return filename
+    if root is not None:
+        filename = os.path.join(add_root(root), name.replace(".", os.sep) + ".py")
+    else:
+        import importlib.util
+        spec = importlib.util.find_spec(name)
+        if spec is None or not spec.has_location:
+            raise ImportError("No module named %r" % name, name=name)
+        filename = spec.origin
+    _locations[key] = filename
+    return filename
+
+
+def _signature(filename):
+    st = os.stat(filename)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _get_code(name, filename):
+    # returns (signature, code), compiling only when the file changed
+    try:
+        signature = _signature(filename)
+    except OSError:
+        _code.pop(filename, None)
+        raise ImportError("No module named %r (%s is gone)" % (name, filename), name=name)
+    cached = _code.get(filename)
+    if cached is not None and cached[0] == signature:
+        return cached
+    from importlib.machinery import SourceFileLoader
+    # the loader reuses and refreshes the __pycache__ bytecode
+    cached = (signature, SourceFileLoader(name, filename).get_code(name))
+    _code[filename] = cached
+    _counters["compiles"] += 1
+    return cached
+
+
+def _execute(name, filename, code, root):
+    # returns (module, fresh), fresh when this was its first import
+    module = sys.modules.get(name)
+    if module is not None and getattr(module, "__file__", None) == filename:
+        with profiler.timed("import", "run " + name):
+            exec(code, module.__dict__)
+        return module, False
+
+    import importlib
+    with profiler.timed("import", "run " + name):
+        if root is None:
+            # packages and dotted names, the import system knows best
+            return importlib.import_module(name), True
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(name, filename)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            exec(code, module.__dict__)
+        except BaseException:
+            # same as a failed import, nothing half initialised is left behind
+            sys.modules.pop(name, None)
+            raise
+    return module, True
+
+
+def run(name, root=None):
+    """
+    Executes the module name (found in root, or through the normal import
+    path when root is None) and returns it. Script-style modules that do
+    their work at import time run again on every call, without another
+    sys.path search or a recompile when the source has not changed.
+    """
+
+    with _lock:
+        filename = _locate(name, root)
+        signature, code = _get_code(name, filename)
+        module, fresh = _execute(name, filename, code, root)
+        _counters["imports" if fresh else "runs"] += 1
+        _loaded[name] = signature
+        return module
+
+
+def load(name, root=None):
+    """
+    Imports the module name once and returns it. Later calls are a stat()
+    of the source file; the module is only executed again after its source
+    has changed.
+    """
+
+    with _lock:
+        module = sys.modules.get(name)
+        filename = _locate(name, root)
+        if module is not None and name not in _loaded:
+            # imported by someone else, take it as it is
+            try:
+                _loaded[name] = _signature(filename)
+            except OSError:
+                pass
+            _counters["hits"] += 1
+            return module
+        if module is not None:
+            try:
+                if _signature(filename) == _loaded[name]:
+                    _counters["hits"] += 1
+                    return module
+            except OSError:
+                # the source went away, keep what is loaded
+                _counters["hits"] += 1
+                return module
+        signature, code = _get_code(name, filename)
+        module, fresh = _execute(name, filename, code, root)
+        _counters["imports" if fresh else "reloads"] += 1
+        _loaded[name] = signature
+        return module
+
+
+def stats():
+    with _lock:
+        result = dict(_counters)
+        result["roots"] = len(_roots)
+        result["cached_code"] = len(_code)
+    result["sys_path"] = len(sys.path)
+    return result
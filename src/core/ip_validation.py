@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# IP address validation for MKSEC
+#
+# The patterns are compiled once at import. is_valid_ipv4/is_valid_ipv6
+# keep the exact acceptance rules core_mksec always had (the IPv4 pattern
+# also takes the hex, octal and short forms inet_aton understands), and
+# validate_many()/validate_file() check and normalize whole scope lists in
+# one call.
+#
+import re
+from collections import namedtuple
+
+IPV4_PATTERN = re.compile(r"""
+    ^
+    (?:
+      # Dotted variants:
+      (?:
+        # Decimal 1-255 (no leading 0's)
+        [3-9]\d?|2(?:5[0-5]|[0-4]?\d)?|1\d{0,2}
+      |
+        0x0*[0-9a-f]{1,2}  # Hexadecimal 0x0 - 0xFF (possible leading 0's)
+      |
+        0+[1-3]?[0-7]{0,2} # Octal 0 - 0377 (possible leading 0's)
+      )
+      (?:                  # Repeat 0-3 times, separated by a dot
+        \.
+        (?:
+          [3-9]\d?|2(?:5[0-5]|[0-4]?\d)?|1\d{0,2}
+        |
+          0x0*[0-9a-f]{1,2}
+        |
+          0+[1-3]?[0-7]{0,2}
+        )
+      ){0,3}
+    |
+      0x0*[0-9a-f]{1,8}    # Hexadecimal notation, 0x0 - 0xffffffff
+    |
+      0+[0-3]?[0-7]{0,10}  # Octal notation, 0 - 037777777777
+    |
+      # Decimal notation, 1-4294967295:
+      429496729[0-5]|42949672[0-8]\d|4294967[01]\d\d|429496[0-6]\d{3}|
+      42949[0-5]\d{4}|4294[0-8]\d{5}|429[0-3]\d{6}|42[0-8]\d{7}|
+      4[01]\d{8}|[1-3]\d{0,9}|[4-9]\d{0,8}
+    )
+    $
+""", re.VERBOSE | re.IGNORECASE)
+
+IPV6_PATTERN = re.compile(r"""
+    ^
+    \s*                         # Leading whitespace
+    (?!.*::.*::)                # Only a single whildcard allowed
+    (?:(?!:)|:(?=:))            # Colon iff it would be part of a wildcard
+    (?:                         # Repeat 6 times:
+        [0-9a-f]{0,4}           # A group of at most four hexadecimal digits
+        (?:(?<=::)|(?<!::):)    # Colon unless preceeded by wildcard
+    ){6}                        #
+    (?:                         # Either
+        [0-9a-f]{0,4}           # Another group
+        (?:(?<=::)|(?<!::):)    # Colon unless preceeded by wildcard
+        [0-9a-f]{0,4}           # Last group
+        (?: (?<=::)             # Colon iff preceeded by exacly one colon
+         |  (?<!:)              #
+         |  (?<=:) (?<!::) :    #
+         )                      # OR
+     |                          # A v4 address with NO leading zeros
+        (?:25[0-4]|2[0-4]\d|1\d\d|[1-9]?\d)
+        (?: \.
+            (?:25[0-4]|2[0-4]\d|1\d\d|[1-9]?\d)
+        ){3}
+    )
+    \s*                         # Trailing whitespace
+    $
+""", re.VERBOSE | re.IGNORECASE | re.DOTALL)
+
+_ipv4_match = IPV4_PATTERN.match
+_ipv6_match = IPV6_PATTERN.match
+
+# one entry of a batch validation
+IPResult = namedtuple("IPResult", "entry valid version normalized")
+
+
+def is_valid_ipv4(ip):
+    return _ipv4_match(ip) is not None
+
+
+def is_valid_ipv6(ip):
+    return _ipv6_match(ip) is not None
+
+
+def is_valid_ip(ip):
+    return _ipv4_match(ip) is not None or _ipv6_match(ip) is not None
+
+
+def is_inet_aton(address):
+    # anything inet_aton accepts, including shorthand like 10.1 or 0x7f000001
+    import socket
+    try:
+        socket.inet_aton(address)
+    except (socket.error, TypeError, ValueError):
+        return False
+    return True
+
+
+def is_dotted_quad(address):
+    """
+    True for a string inet_aton accepts that is also written as four
+    dot separated parts, which is what the menus ask the user for.
+    """
+
+    return is_inet_aton(address) and len(address.split('.')) == 4
+
+
+def normalize(ip):
+    """
+    Returns (version, canonical form) for a valid address, or (None, None).
+    IPv4 shorthand such as 0x7f.1 comes back as 127.0.0.1 and IPv6 is
+    compressed and lower cased.
+    """
+
+    ip = ip.strip()
+    if _ipv4_match(ip) is not None:
+        import socket
+        try:
+            return 4, socket.inet_ntoa(socket.inet_aton(ip))
+        except (socket.error, ValueError):
+            return None, None
+    if _ipv6_match(ip) is not None:
+        import ipaddress
+        try:
+            return 6, ipaddress.IPv6Address(ip).compressed
+        except ValueError:
+            return None, None
+    return None, None
+
+
+def validate_many(entries):
+    """
+    Validates and normalizes every address in an iterable and returns one
+    IPResult per entry, in order. Surrounding whitespace is ignored.
+    """
+
+    results = []
+    append = results.append
+    for entry in entries:
+        version, normalized = normalize(entry)
+        append(IPResult(entry, version is not None, version, normalized))
+    return results
+
+
+def validate_file(path):
+    """
+    Batch validates an address list file. Blank lines and # comments are
+    skipped; every other line becomes an IPResult.
+    """
+
+    with open(path, "r") as fileopen:
+        entries = [line.strip() for line in fileopen]
+    return validate_many(entry for entry in entries if entry and not entry.startswith("#"))
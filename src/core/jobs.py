@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+#
+# Background jobs for MKSEC
+#
+# Housekeeping that used to hold up the menus (updating MKSEC, starting
+# services, the release check) runs here on a few daemon worker threads
+# instead. Leaving MKSEC cancels them, except for jobs that are not
+# interruptible (an update), which it waits for.
+#
+# Every job has a status, the last line of output as its progress, and a
+# cancel event that runner.run() honours, so an operator can look at or
+# stop a job from the "jobs" command at the main prompt. Results and errors
+# go to the MKSEC log; the banner shows what is running and what finished
+# since it was last drawn.
+#
+import itertools
+import threading
+import time
+
+# jobs running at the same time, the rest wait in the queue
+MAX_WORKERS = 2
+
+# finished jobs kept for the jobs listing
+HISTORY = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_lock = threading.Lock()
+_queue = None
+_workers = []
+_ids = itertools.count(1)
+_jobs = []
+# finished jobs the banner has not reported yet
+_unseen = []
+
+
+class JobCancelled(Exception):
+    """ Raised inside a job that noticed it was cancelled. """
+
+
+class Job:
+    """ One background operation and what is known about it. """
+
+    def __init__(self, name):
+        self.id = next(_ids)
+        self.name = name
+        self.status = QUEUED
+        self.progress = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # banner stays silent about quiet jobs, the jobs listing does not
+        self.quiet = False
+        # False for jobs that must not be stopped halfway (an update), the
+        # way out of MKSEC waits for them instead of cancelling them
+        self.interruptible = True
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        # for long jobs written in python, call between steps
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        """ Asks the job to stop. Returns False if it had already finished. """
+
+        if not self.active:
+            return False
+        self.cancel_event.set()
+        with _lock:
+            # never started, a worker will skip it
+            marked = self.status == QUEUED and _mark(self, CANCELLED)
+        if marked:
+            _report(self)
+        return True
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def describe(self):
+        text = "[%d] %s: %s" % (self.id, self.name, self.status)
+        if self.status == RUNNING:
+            text += " %ds" % self.elapsed()
+            if self.progress:
+                text += " - %s" % self.progress[:50]
+        elif self.status == FAILED and self.error:
+            text += " - %s" % self.error
+        return text
+
+    def __repr__(self):
+        return "<Job %s>" % self.describe()
+
+
+def _log(level, message, **fields):
+    try:
+        from src.core import logger
+        getattr(logger, level)(message, "jobs", **fields)
+    except Exception:
+        pass
+
+
+def _mark(job, status, result=None, error=None):
+    # caller holds _lock, False if the job had already finished
+    if job._done.is_set():
+        return False
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished = time.time()
+    _unseen.append(job)
+    job._done.set()
+    return True
+
+
+def _report(job):
+    fields = {"job": job.id, "status": job.status, "duration_ms": round(job.elapsed() * 1000, 3)}
+    if job.status == FAILED:
+        _log("error", "job %s failed: %s" % (job.name, job.error), **fields)
+    else:
+        _log("info", "job %s %s" % (job.name, job.status), **fields)
+
+
+def _finish(job, status, result=None, error=None):
+    with _lock:
+        marked = _mark(job, status, result, error)
+    if marked:
+        _report(job)
+
+
+def _execute(job, func, args, kwargs):
+    with _lock:
+        if job._done.is_set():
+            # cancelled while it was queued
+            return
+        job.status = RUNNING
+        job.started = time.time()
+    try:
+        result = func(job, *args, **kwargs)
+    except JobCancelled:
+        _finish(job, CANCELLED)
+        return
+    except Exception as error:
+        _finish(job, FAILED, error="%s: %s" % (type(error).__name__, error))
+        return
+    _finish(job, CANCELLED if job.cancelled else DONE, result=result)
+
+
+def _worker():
+    while True:
+        job, func, args, kwargs = _queue.get()
+        _execute(job, func, args, kwargs)
+
+
+def _start_workers():
+    # caller holds _lock
+    global _queue
+    if _queue is None:
+        import queue
+        _queue = queue.Queue()
+    # workers do not survive a fork, a forked session starts its own
+    _workers[:] = [worker for worker in _workers if worker.is_alive()]
+    while len(_workers) < MAX_WORKERS:
+        worker = threading.Thread(target=_worker, name="mksec-job-%d" % (len(_workers) + 1))
+        worker.daemon = True
+        worker.start()
+        _workers.append(worker)
+
+
+def submit(name, func, *args, quiet=False, **kwargs):
+    """
+    Runs func(job, *args, **kwargs) in the background and returns the Job.
+    func can update job.progress and should stop when job.cancelled is set;
+    an exception marks the job failed with the exception as its error.
+    quiet keeps the job out of the banner from the start.
+    """
+
+    job = Job(name)
+    job.quiet = quiet
+    with _lock:
+        _start_workers()
+        _jobs.append(job)
+        finished = [item for item in _jobs if not item.active]
+        for item in finished[:max(0, len(finished) - HISTORY)]:
+            _jobs.remove(item)
+        _queue.put((job, func, args, kwargs))
+    _log("info", "job %s queued" % name, job=job.id)
+    return job
+
+
+def _run_command(job, argv, **kwargs):
+    from src.core import runner
+
+    def progress(line):
+        if line.strip():
+            job.progress = line.strip()
+
+    result = runner.run(argv, cancel=job.cancel_event, on_line=progress, **kwargs)
+    if result.cancelled:
+        raise JobCancelled()
+    if not result.ok:
+        raise RuntimeError("%s %s" % (" ".join(argv), result.describe()))
+    return result
+
+
+def submit_command(name, argv, **kwargs):
+    """
+    Runs argv with runner.run() as a job, keyword arguments are passed on
+    (timeout, cwd, env ...). The job fails when the command does.
+    """
+
+    return submit(name, _run_command, argv, **kwargs)
+
+
+def submit_commands(name, commands, **kwargs):
+    # runs several commands one after the other as a single job
+    def sequence(job):
+        results = []
+        for argv in commands:
+            job.check_cancelled()
+            results.append(_run_command(job, argv, **kwargs))
+        return results
+    return submit(name, sequence)
+
+
+def jobs():
+    with _lock:
+        return list(_jobs)
+
+
+def active():
+    return [job for job in jobs() if job.active]
+
+
+def get(job_id):
+    for job in jobs():
+        if job.id == job_id:
+            return job
+    return None
+
+
+def find(name):
+    # the newest job called name that is still queued or running
+    for job in reversed(jobs()):
+        if job.name == name and job.active:
+            return job
+    return None
+
+
+def cancel(job_id):
+    job = get(job_id)
+    return job is not None and job.cancel()
+
+
+def status_lines():
+    """
+    Lines for the banner: every running job, then the jobs that finished
+    since the banner was last drawn (each reported once).
+    """
+
+    with _lock:
+        finished = [job for job in _unseen if not job.quiet]
+        del _unseen[:]
+    running = [job for job in active() if not job.quiet]
+    return [job.describe() for job in running + finished]
+
+
+def uninterruptible():
+    # running jobs shutdown() leaves alone
+    return [job for job in active() if not job.interruptible and job.status == RUNNING]
+
+
+def shutdown(timeout=5):
+    """
+    Cancels what is still queued or running and waits up to timeout
+    seconds for it to stop. A running job that is not interruptible is
+    left to finish; wait for uninterruptible() first. Called on the way
+    out of MKSEC.
+    """
+
+    running = [job for job in active() if job.interruptible or job.cancelled or job.status == QUEUED]
+    for job in running:
+        job.cancel()
+    deadline = time.time() + timeout
+    for job in running:
+        job.wait(max(0, deadline - time.time()))
+    return [job for job in running if job.active]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+#
+# Logging backend for MKSEC
+#
+# Records are queued by the caller and written by a background listener
+# thread as JSON lines into src/logs/mksec.log. The file is rotated when it
+# grows past LOG_MAX_BYTES or gets older than LOG_MAX_AGE seconds, and
+# rotated files are gzip compressed. core_mksec.log() and exit_mksec() are
+# the usual entry points; everything here is set up on first use so
+# importing core_mksec does not pay for the logging package.
+#
+import atexit
+import calendar
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+from src.core.config_store import config
+
+# defaults, overridable from set.config
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 86400
+DEFAULT_BACKUPS = 5
+
+LOGGER_NAME = "mksec"
+
+# src/logs of the tree this module was loaded from, wherever MKSEC was
+# started; a checkout never logs into (or creates) /usr/share/mksec
+LOG_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs"))
+
+_session_start = time.time()
+_lock = threading.Lock()
+_listener = None
+_logger = None
+
+
+class JSONLineFormatter(logging.Formatter):
+    """ One JSON object per record, with module and timing fields. """
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + ".%03dZ" % record.msecs,
+            "level": record.levelname,
+            "module": getattr(record, "mksec_module", None) or record.module,
+            "pid": record.process,
+            "uptime_s": round(record.created - _session_start, 3),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "mksec_fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+JSONLineFormatter.converter = time.gmtime
+
+
+class RotatingJSONHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size and age based rotation with gzip compressed backups.
+    """
+
+    def __init__(self, filename, max_bytes, max_age, backups):
+        logging.handlers.RotatingFileHandler.__init__(
+            self, filename, maxBytes=max_bytes, backupCount=backups, delay=True)
+        self.max_age = max_age
+        self._started = None
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+
+    def _opened_at(self):
+        # the first record in the file tells us when it was started
+        if self._started is None:
+            self._started = time.time()
+            try:
+                with open(self.baseFilename, "r") as fileopen:
+                    first = json.loads(fileopen.readline())
+                self._started = calendar.timegm(time.strptime(first["ts"][:19], "%Y-%m-%dT%H:%M:%S"))
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                pass
+        return self._started
+
+    def shouldRollover(self, record):
+        if logging.handlers.RotatingFileHandler.shouldRollover(self, record):
+            return True
+        if self.max_age > 0 and os.path.isfile(self.baseFilename) \
+                and os.path.getsize(self.baseFilename) > 0:
+            return time.time() - self._opened_at() >= self.max_age
+        return False
+
+    def doRollover(self):
+        logging.handlers.RotatingFileHandler.doRollover(self)
+        self._started = time.time()
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as fileopen, gzip.open(dest, "wb") as filewrite:
+            shutil.copyfileobj(fileopen, filewrite)
+        os.remove(source)
+
+
+def log_path():
+    return os.path.join(LOG_DIR, "mksec.log")
+
+
+def get_logger():
+    global _listener, _logger
+    if _logger is not None:
+        return _logger
+    with _lock:
+        if _logger is not None:
+            return _logger
+        path = log_path()
+        # src/logs may be missing from a fresh tree, nothing above it is made
+        if not os.path.isdir(os.path.dirname(path)):
+            os.mkdir(os.path.dirname(path))
+        handler = RotatingJSONHandler(
+            path,
+            config.get_int("LOG_MAX_BYTES", DEFAULT_MAX_BYTES),
+            config.get_int("LOG_MAX_AGE", DEFAULT_MAX_AGE),
+            config.get_int("LOG_BACKUPS", DEFAULT_BACKUPS))
+        handler.setFormatter(JSONLineFormatter())
+
+        records = queue.Queue(-1)
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.addHandler(logging.handlers.QueueHandler(records))
+
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+        atexit.register(shutdown)
+        _logger = logger
+    return _logger
+
+
+def _caller_module(depth):
+    try:
+        return sys._getframe(depth + 1).f_globals.get("__name__")
+    except ValueError:
+        return None
+
+
+def event(level, message, module=None, **fields):
+    """
+    Queues one record. Extra keyword arguments (duration_ms, argv, ...)
+    are written as top level JSON fields.
+    """
+
+    try:
+        logger = get_logger()
+    except (IOError, OSError):
+        return
+    if module is None:
+        module = _caller_module(1)
+    logger.log(level, str(message), extra={"mksec_module": module, "mksec_fields": fields})
+
+
+def error(message, module=None, **fields):
+    event(logging.ERROR, message, module or _caller_module(1), **fields)
+
+
+def warning(message, module=None, **fields):
+    event(logging.WARNING, message, module or _caller_module(1), **fields)
+
+
+def info(message, module=None, **fields):
+    event(logging.INFO, message, module or _caller_module(1), **fields)
+
+
+def flush():
+    # drain everything queued so far to disk, keeps logging available
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.flush()
+            _listener.start()
+
+
+def _after_fork():
+    # the listener thread does not survive a fork (daemon sessions), the
+    # child sets up its own on first use
+    global _lock, _listener, _logger
+    _lock = threading.Lock()
+    if _logger is not None:
+        for handler in list(_logger.handlers):
+            _logger.removeHandler(handler)
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
+    _logger = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def shutdown():
+    global _listener, _logger
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        if _logger is not None:
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+        _logger = None
@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # text menu for mksec menu stuff
 from src.core.core_mksec import bcolors, get_version, check_os
+from src.core import dictionaries
 
-# grab version of MKSEC
-define_version = get_version()
+# grab version of MKSEC lazily, only readers of text.define_version pay for it
+def __getattr__(name):
+    if name == "define_version":
+        return get_version()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 # check operating system
 operating_system = check_os()
@@ -386,3 +390,17 @@ fakeap_dhcp_menu = ['10.0.0.100-254',
                     '192.168.10.100-254\n']
 
 fakeap_dhcp_text = "Please choose the DHCP configuration you would like to use: "
+
+# every numbered entry of the table driven menus must resolve in its
+# dictionaries.py table, checked once at import. Past the first 6 entries
+# the teensy menu is handled by set.py directly.
+for _menu, _table, _entries in (
+        ('encoder_menu', 'encoder_type', None),
+        ('browser_exploits_menu', 'ms_module', None),
+        ('payload_menu_2', 'ms_payload', None),
+        ('payload_menu_3', 'ms_payload_3', None),
+        ('create_payloads_menu', 'ms_attacks', None),
+        ('webattack_menu', 'webattack_vector', None),
+        ('teensy_menu', 'teensy_config', 6)):
+    dictionaries.check_menu(globals()[_menu], _table, _entries, _menu)
+del _menu, _table, _entries
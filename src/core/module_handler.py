@@ -2,10 +2,8 @@
 
 # module_handler.py
 
-import glob
-import re
-import sys
 from src.core.core_mksec import *
+from src.core.module_registry import registry
 
 # this is just if the user wants to return to menu
 menu_return = "false"
@@ -19,19 +17,11 @@ print_info_spaces("Social-Engineer Toolkit Third Party Modules menu.")
 print_info_spaces(
     "Please read the readme/modules.txt for information on how to create your own modules.\n")
 
-for name in glob.glob("modules/*.py"):
-
+# titles come from the registry cache, only changed files are re-read
+modules = registry.scan()
+for info in modules:
     counter = counter + 1
-    fileopen = open(name, "r")
-
-    for line in fileopen:
-        line = line.rstrip()
-        match = re.search("MAIN=", line)
-        if match:
-            line = line.replace('MAIN="', "")
-            line = line.replace('"', "")
-            line = "  " + str(counter) + ". " + line
-            print(line)
+    print("  " + str(counter) + ". " + info.title)
 
 print("\n  99. Return to the previous menu\n")
 choice = raw_input(setprompt(["9"], ""))
@@ -47,36 +37,22 @@ try:
     choice = int(choice)
 except:
     print_warning("An integer was not used try again")
-    choice = raw_input(setprompt(["9"], ""))
-
-# start a new counter to match choice
-counter = 0
+    try:
+        choice = int(raw_input(setprompt(["9"], "")))
+    except ValueError:
+        choice = 0
 
 if menu_return == "false":
-    # pull any files in the modules directory that starts with .py
-    for name in glob.glob("modules/*.py"):
-
-        counter = counter + 1
-
-        if counter == int(choice):
-            # get rid of .modules extension
-            name = name.replace("modules/", "")
-            # get rid of .py extension
-            name = name.replace(".py", "")
-            # changes our system path to modules so we can import the files
-            sys.path.append("modules/")
-            # this will import the third party module
-
-            try:
-                exec("import " + name)
-            except:
-                pass
-
-            # this will call the main() function inside the python file
-            # if it doesn't exist it will still continue just throw a warning
-            try:
-                exec("%s.main()" % (name))
-            # handle the exception if main isn't there
-            except Exception as e:
-                raw_input("   [!] There was an issue with a module: %s." % (e))
-                return_continue()
+    if 0 < choice <= len(modules):
+        info = modules[choice - 1]
+        # this will load the module from its file (sys.path is left alone)
+        # and call the main() function inside it; if either fails it will
+        # still continue and just throw a warning
+        try:
+            module = registry.load(info)
+            debug_msg("module_handler", "%s loaded in %.3fs", 3, info.name, info.load_time)
+            module.main()
+        # handle the exception if main isn't there
+        except Exception as e:
+            raw_input("   [!] There was an issue with a module: %s." % (e))
+            return_continue()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# Registry of third party modules (modules/*.py)
+#
+# The menu title of a module is its MAIN="..." line. Titles are cached per
+# file together with the file's mtime and size, so revisiting the menu only
+# re-reads modules that changed, and a file is only read up to its MAIN=
+# line. Modules are loaded through importlib from their path, sys.path is
+# left alone, and the time each load took is kept and logged.
+#
+import os
+import threading
+import time
+
+MODULES_DIR = "modules"
+
+# name prefix in sys.modules so a module called e.g. "socket" cannot shadow
+# the real one
+PACKAGE_PREFIX = "mksec_modules."
+
+
+class ModuleInfo:
+    """ Metadata of one third party module. """
+
+    __slots__ = ("name", "path", "title", "signature", "load_time")
+
+    def __init__(self, name, path, title, signature):
+        self.name = name
+        self.path = path
+        self.title = title
+        self.signature = signature
+        self.load_time = None
+
+    def __repr__(self):
+        return "<ModuleInfo %s %r>" % (self.name, self.title)
+
+
+def read_title(path):
+    # the MAIN="..." line, or None; stops reading as soon as it is found
+    with open(path, "r", errors="replace") as fileopen:
+        for line in fileopen:
+            if "MAIN=" in line:
+                line = line.rstrip()
+                return line.replace('MAIN="', "").replace('"', "").strip()
+    return None
+
+
+class ModuleRegistry:
+
+    def __init__(self, directory=MODULES_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._infos = {}
+        self._loaded = {}
+        self.reads = 0
+
+    def scan(self):
+        """
+        Returns the ModuleInfo of every module with a MAIN= title, sorted by
+        file name so menu numbers are stable between visits.
+        """
+
+        seen = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            entries = []
+        with self._lock:
+            for entry in entries:
+                if not entry.name.endswith(".py") or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                signature = (st.st_mtime_ns, st.st_size)
+                info = self._infos.get(entry.path)
+                if info is None or info.signature != signature:
+                    try:
+                        title = read_title(entry.path)
+                    except (IOError, OSError):
+                        continue
+                    self.reads += 1
+                    info = ModuleInfo(entry.name[:-3], entry.path, title, signature)
+                seen[entry.path] = info
+            self._infos = seen
+        return sorted((info for info in seen.values() if info.title),
+                      key=lambda info: info.name)
+
+    def load(self, info):
+        """
+        Imports a module from its file, once per version of the file, and
+        returns it. The load time in seconds is stored on info.load_time.
+        """
+
+        import importlib.util
+        import sys
+        cached = self._loaded.get(info.path)
+        if cached is not None and cached[0] == info.signature:
+            return cached[1]
+
+        started = time.time()
+        module_name = PACKAGE_PREFIX + info.name
+        spec = importlib.util.spec_from_file_location(module_name, info.path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            sys.modules.pop(module_name, None)
+            raise
+        info.load_time = time.time() - started
+        self._loaded[info.path] = (info.signature, module)
+
+        from src.core import logger
+        logger.info("loaded third party module %s" % info.name,
+                    path=info.path, duration_ms=round(info.load_time * 1000, 3))
+        return module
+
+    def load_times(self):
+        # {name: seconds} for every module loaded this session
+        return dict((info.name, info.load_time) for info in self._infos.values()
+                    if info.load_time is not None)
+
+
+# shared registry, kept across visits of the modules menu
+registry = ModuleRegistry()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Local address resolver for MKSEC
+#
+# Finds the address MKSEC should hand out as LHOST/IPADDR without any name
+# resolution: the egress interface comes from the kernel routing table
+# (/proc/net/route, default route with the lowest metric first) and its
+# IPv4 address from an SIOCGIFADDR ioctl. Where /proc is not available an
+# unconnected UDP socket is "connected" to a literal address, which only
+# asks the kernel for a route and sends nothing.
+#
+# The answer is cached until the routing table changes (or CACHE_TTL runs
+# out, for address changes that leave the routes alone), so asking at
+# every IP prompt is free, also on lab networks without DNS.
+#
+import os
+import struct
+import threading
+import time
+
+ROUTE_FILE = "/proc/net/route"
+
+# ioctl request for an interface's IPv4 address (linux/sockios.h)
+SIOCGIFADDR = 0x8915
+
+# RTF_UP from linux/route.h
+RTF_UP = 0x0001
+
+# literal address for the UDP fallback, TEST-NET-2 (RFC 5737), never resolved
+FALLBACK_TARGET = "198.51.100.1"
+
+# seconds a cached answer is trusted while the routes stay the same
+CACHE_TTL = 60
+
+_lock = threading.Lock()
+# (route table text, time) -> (interface, address)
+_cache = None
+
+
+class Route:
+    __slots__ = ("interface", "destination", "gateway", "mask", "metric", "flags")
+
+    def __init__(self, interface, destination, gateway, mask, metric, flags):
+        self.interface = interface
+        self.destination = destination
+        self.gateway = gateway
+        self.mask = mask
+        self.metric = metric
+        self.flags = flags
+
+    @property
+    def default(self):
+        return self.destination == 0 and self.mask == 0
+
+    def __repr__(self):
+        return "<Route %s %s/%s via %s metric %d>" % (
+            self.interface, _ntoa(self.destination), _ntoa(self.mask), _ntoa(self.gateway), self.metric)
+
+
+def _ntoa(value):
+    # /proc/net/route prints addresses as host order hex of the packed bytes
+    return ".".join(str(octet) for octet in struct.pack("<I", value))
+
+
+def _read_routes_text(path=ROUTE_FILE):
+    try:
+        with open(path, "r") as fileopen:
+            return fileopen.read()
+    except (IOError, OSError):
+        return None
+
+
+def parse_routes(text):
+    """ Routes that are up, from the text of /proc/net/route. """
+
+    routes = []
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        try:
+            flags = int(fields[3], 16)
+            route = Route(fields[0], int(fields[1], 16), int(fields[2], 16),
+                          int(fields[7], 16), int(fields[6]), flags)
+        except ValueError:
+            continue
+        if flags & RTF_UP:
+            routes.append(route)
+    return routes
+
+
+def egress_interface(routes):
+    """
+    The interface traffic to the outside leaves through: the default route
+    with the lowest metric, or else the first non-loopback interface with
+    any route at all (isolated networks often have no default route).
+    """
+
+    defaults = sorted((route for route in routes if route.default), key=lambda route: route.metric)
+    if defaults:
+        return defaults[0].interface
+    for route in sorted(routes, key=lambda route: route.metric):
+        if route.interface != "lo":
+            return route.interface
+    return None
+
+
+def interface_address(interface):
+    # IPv4 address of interface, None when it has none
+    import fcntl
+    import socket
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        packed = fcntl.ioctl(probe.fileno(), SIOCGIFADDR,
+                             struct.pack("256s", interface[:15].encode("utf-8")))
+    except (IOError, OSError):
+        return None
+    finally:
+        probe.close()
+    return socket.inet_ntoa(packed[20:24])
+
+
+def _udp_address():
+    import socket
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect((FALLBACK_TARGET, 9))
+        address = probe.getsockname()[0]
+    except (IOError, OSError):
+        return None
+    finally:
+        probe.close()
+    return None if address == "0.0.0.0" else address
+
+
+def _resolve(routes_text):
+    if routes_text is not None and os.name == "posix":
+        interface = egress_interface(parse_routes(routes_text))
+        if interface is not None:
+            address = interface_address(interface)
+            if address is not None:
+                return interface, address
+    return None, _udp_address()
+
+
+def egress(refresh=False):
+    """
+    Returns (interface, address) of the egress interface; interface is None
+    when the address came from the UDP fallback, address is None when
+    nothing could be found.
+    """
+
+    global _cache
+    routes_text = _read_routes_text()
+    now = time.time()
+    with _lock:
+        if not refresh and _cache is not None:
+            (text, stamp), answer = _cache
+            if text == routes_text and now - stamp < CACHE_TTL:
+                return answer
+        answer = _resolve(routes_text)
+        _cache = ((routes_text, now), answer)
+        return answer
+
+
+def local_address(refresh=False):
+    return egress(refresh)[1]
+
+
+def invalidate():
+    global _cache
+    with _lock:
+        _cache = None
+
+
+if __name__ == "__main__":
+    routes_text = _read_routes_text()
+    for route in parse_routes(routes_text or ""):
+        print(route)
+    interface, address = egress(refresh=True)
+    print("egress: %s %s" % (interface or "(udp fallback)", address or "not found"))
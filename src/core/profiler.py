@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+#
+# Session profiling for MKSEC (setoolkit --profile or MKSEC_PROFILE=1)
+#
+# When enabled, the whole session runs under cProfile and a few hooks time
+# what an operator cares about:
+#
+#   action   every menu selection, from the answer to the next prompt
+#   import   every module import and reload
+#   config   set.config reads (ConfigStore.get)
+#   options  set.options reads and writes (SessionStore)
+#
+# The hooks are only installed by start(), a normal session pays nothing.
+# At exit a pstats dump and a readable summary are written to
+# ~/.set/reports/profile-<timestamp>.{pstats,txt}, which the startup
+# cleanup leaves alone.
+#
+import os
+import sys
+import threading
+import time
+
+ENV_FLAG = "MKSEC_PROFILE"
+FLAG = "--profile"
+
+# rows of the cProfile listing in the text summary
+TOP_FUNCTIONS = 30
+
+_active = False
+_started = None
+_profile = None
+_lock = threading.Lock()
+# category -> label -> [count, total, max]
+_timings = {}
+_restore = []
+_pending_action = None
+
+
+def requested(argv=None):
+    # True if --profile is on the command line or MKSEC_PROFILE is set
+    argv = sys.argv if argv is None else argv
+    return FLAG in argv or os.environ.get(ENV_FLAG, "") not in ("", "0")
+
+
+def active():
+    return _active
+
+
+def record(category, label, seconds):
+    with _lock:
+        labels = _timings.setdefault(category, {})
+        entry = labels.get(label)
+        if entry is None:
+            labels[label] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+class timed:
+    """
+    Context manager timing a block into category/label, free when
+    profiling is off:
+
+        with profiler.timed("action", "clone site"):
+            ...
+    """
+
+    __slots__ = ("category", "label", "started")
+
+    def __init__(self, category, label):
+        self.category = category
+        self.label = label
+
+    def __enter__(self):
+        self.started = time.perf_counter() if _active else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            record(self.category, self.label, time.perf_counter() - self.started)
+        return False
+
+
+def _wrap(owner, name, category, label_of):
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            record(category, label_of(args, kwargs), time.perf_counter() - started)
+
+    wrapper.__name__ = getattr(original, "__name__", name)
+    wrapper.__doc__ = getattr(original, "__doc__", None)
+    setattr(owner, name, wrapper)
+    _restore.append((owner, name, original))
+
+
+def _strip_ansi(text):
+    import re
+    return re.sub(r"\x1b\[[0-9;]*m", "", str(text)).strip()
+
+
+def _close_action():
+    # the previous selection ends when the next prompt is shown
+    global _pending_action
+    if _pending_action is not None:
+        label, started = _pending_action
+        record("action", label, time.perf_counter() - started)
+        _pending_action = None
+
+
+def _install_input_hook():
+    import builtins
+    original = builtins.input
+
+    def profiled_input(prompt=""):
+        global _pending_action
+        _close_action()
+        answer = original(prompt)
+        menu = _strip_ansi(prompt).rstrip(">: ").strip() or "prompt"
+        _pending_action = ("%s -> %s" % (menu, answer.strip()[:40]), time.perf_counter())
+        return answer
+
+    builtins.input = profiled_input
+    _restore.append((builtins, "input", original))
+
+
+def _install_import_hook():
+    import builtins
+    import importlib
+    original_import = builtins.__import__
+
+    def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+        # only real loads are timed, not lookups in sys.modules
+        if level or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        started = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            record("import", name, time.perf_counter() - started)
+
+    builtins.__import__ = profiled_import
+    _restore.append((builtins, "__import__", original_import))
+    _wrap(importlib, "reload", "import", lambda args, kwargs: "reload " + args[0].__name__)
+
+
+def _install_store_hooks():
+    from src.core.config_store import ConfigStore
+    from src.core.session_state import SessionStore
+    _wrap(ConfigStore, "get", "config", lambda args, kwargs: "get " + str(args[1]).rstrip("="))
+    _wrap(SessionStore, "get", "options", lambda args, kwargs: "get " + str(args[1]).rstrip("="))
+    _wrap(SessionStore, "set", "options", lambda args, kwargs: "set " + str(args[1]).rstrip("="))
+    _wrap(SessionStore, "write_state", "options", lambda args, kwargs: "write " + str(args[1]))
+
+
+def start():
+    """
+    Turns profiling on for the rest of the process. Call it before the rest
+    of MKSEC is imported so its imports are timed too.
+    """
+
+    global _active, _started, _profile
+    if _active:
+        return
+    import atexit
+    import cProfile
+    _started = time.time()
+    _install_input_hook()
+    _install_import_hook()
+    _install_store_hooks()
+    _profile = cProfile.Profile()
+    _profile.enable()
+    _active = True
+    atexit.register(stop)
+
+
+def summary():
+    lines = ["MKSEC profile of a %.1fs session started %s" % (
+        time.time() - _started, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_started))), ""]
+    with _lock:
+        timings = dict((category, dict(labels)) for category, labels in _timings.items())
+    for category in ("action", "import", "config", "options"):
+        labels = timings.pop(category, {})
+        lines.append(_table(category, labels))
+    for category, labels in sorted(timings.items()):
+        lines.append(_table(category, labels))
+    manager = sys.modules.get("src.core.import_manager")
+    if manager is not None:
+        lines.append("== import manager ==\n%s\n" % " ".join(
+            "%s=%s" % item for item in sorted(manager.stats().items())))
+    return "\n".join(lines)
+
+
+def _table(category, labels):
+    total = sum(entry[1] for entry in labels.values())
+    count = sum(entry[0] for entry in labels.values())
+    lines = ["== %s: %d calls, %.3f ms total ==" % (category, count, total * 1000)]
+    lines.append("%10s %8s %12s %12s  %s" % ("total ms", "calls", "mean ms", "max ms", "label"))
+    for label, entry in sorted(labels.items(), key=lambda item: item[1][1], reverse=True):
+        lines.append("%10.3f %8d %12.3f %12.3f  %s" % (
+            entry[1] * 1000, entry[0], entry[1] * 1000 / entry[0], entry[2] * 1000, label))
+    return "\n".join(lines) + "\n"
+
+
+def stop():
+    """
+    Stops profiling, restores the hooks and writes the reports. Returns the
+    path of the text summary, or None when profiling was not running.
+    """
+
+    global _active
+    if not _active:
+        return None
+    _profile.disable()
+    _close_action()
+    _active = False
+    for owner, name, original in reversed(_restore):
+        setattr(owner, name, original)
+    del _restore[:]
+
+    import io
+    import pstats
+    from src.core.core_mksec import userconfigpath
+    reports = os.path.join(userconfigpath, "reports")
+    if not os.path.isdir(reports):
+        os.makedirs(reports)
+    base = os.path.join(reports, "profile-%s" % time.strftime("%Y%m%d-%H%M%S", time.localtime(_started)))
+    _profile.dump_stats(base + ".pstats")
+
+    listing = io.StringIO()
+    pstats.Stats(_profile, stream=listing).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    with open(base + ".txt", "w") as filewrite:
+        filewrite.write(summary())
+        filewrite.write("\n== cProfile, top %d by cumulative time ==\n" % TOP_FUNCTIONS)
+        filewrite.write(listing.getvalue())
+    sys.stderr.write("[*] Profile written to %s.txt (pstats data in %s.pstats)\n" % (base, base))
+    return base + ".txt"
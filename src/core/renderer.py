@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# Terminal frame renderer for the MKSEC menus and banner
+#
+# Screens are cleared with escape sequences instead of forking a shell for
+# clear(1), and each frame goes out in a single write. Frames that never
+# change (menus, banner art) are rendered once and cached; the cache key
+# always carries the terminal size and the caller's color mode, so a resize
+# or a color switch renders a fresh frame.
+#
+import os
+import sys
+
+# home, clear screen, clear scrollback
+CLEAR_SEQUENCE = "\033[H\033[2J\033[3J"
+
+DEFAULT_SIZE = (80, 24)
+
+_frames = {}
+_hits = 0
+_misses = 0
+
+
+def terminal_size():
+    try:
+        return tuple(os.get_terminal_size(sys.stdout.fileno()))
+    except (AttributeError, OSError, ValueError):
+        return DEFAULT_SIZE
+
+
+def frame(key, build, color_key=None):
+    """
+    Returns the cached frame for key, calling build() to render it on the
+    first use and whenever the terminal size or color_key changed.
+    """
+
+    global _hits, _misses
+    full_key = (key, terminal_size(), color_key)
+    cached = _frames.get(full_key)
+    if cached is None:
+        _misses += 1
+        cached = _frames[full_key] = build()
+    else:
+        _hits += 1
+    return cached
+
+
+def clear_sequence():
+    # "" where escape sequences are not understood, see clear()
+    if os.name == "posix":
+        return CLEAR_SEQUENCE
+    return ""
+
+
+def clear():
+    if os.name == "posix":
+        write(CLEAR_SEQUENCE)
+    else:
+        os.system("cls")
+
+
+def write(*chunks):
+    # one write and one flush per frame, however many parts it has
+    sys.stdout.write("".join(chunks))
+    sys.stdout.flush()
+
+
+def invalidate():
+    _frames.clear()
+
+
+def stats():
+    return {"frames": len(_frames), "hits": _hits, "misses": _misses}
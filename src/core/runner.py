@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+#
+# Process runner for MKSEC
+#
+# Every external command goes through run(): argv only (no intermediate
+# shell), an optional timeout, output read line by line into the log (and
+# echoed to the terminal when asked), and a Result carrying the exit code.
+# The child is always waited for, so nothing is left behind as a zombie.
+# run_async()/run_many() execute independent commands concurrently.
+#
+import os
+import sys
+import threading
+import time
+
+# seconds between checks of the deadline and the cancel event
+POLL_INTERVAL = 0.1
+
+# after terminate(), how long the child gets before it is killed
+KILL_GRACE = 2
+
+# exit code reported when the program could not be started at all
+NOT_FOUND = 127
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class RunError(Exception):
+    """ Raised by run(check=True) when a command fails or times out. """
+
+    def __init__(self, result):
+        Exception.__init__(self, "%s %s" % (" ".join(result.argv), result.describe()))
+        self.result = result
+
+
+class Result:
+    """ Outcome of one command. """
+
+    def __init__(self, argv):
+        self.argv = list(argv)
+        self.returncode = None
+        self.output = []
+        self.duration = 0.0
+        self.timed_out = False
+        self.cancelled = False
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    @property
+    def text(self):
+        return "\n".join(self.output)
+
+    def describe(self):
+        if self.timed_out:
+            return "timed out after %.1fs" % self.duration
+        if self.cancelled:
+            return "was cancelled"
+        return "exited with %s" % self.returncode
+
+    def __repr__(self):
+        return "<Result %s %s>" % (self.argv[0], self.describe())
+
+
+def _log(level, message, **fields):
+    # level is the name of a logger helper: "info", "warning" or "error"
+    try:
+        from src.core import logger
+        getattr(logger, level)(message, "runner", **fields)
+    except Exception:
+        # logging must never break a command
+        pass
+
+
+def _reader(stream, result, echo, log, name, on_line):
+    for line in iter(stream.readline, ""):
+        line = line.rstrip("\n")
+        result.output.append(line)
+        if on_line is not None:
+            try:
+                on_line(line)
+            except Exception:
+                pass
+        if echo:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+        if log:
+            _log("info", line, command=name, stream="output")
+    stream.close()
+
+
+def _stop(process):
+    try:
+        process.terminate()
+        process.wait(KILL_GRACE)
+    except Exception:
+        try:
+            process.kill()
+            process.wait()
+        except Exception:
+            pass
+
+
+def run(argv, timeout=None, cwd=None, env=None, check=False, echo=False,
+        log=True, cancel=None, stdin_data=None, on_line=None):
+    """
+    Runs argv (a list, never a shell string) and returns a Result.
+
+    timeout is in seconds; the child is terminated, then killed, when it
+    runs over. cancel is an optional threading.Event that stops the child
+    the same way. echo copies the output to the terminal as it arrives,
+    stdin_data is written to the child's standard input, and on_line is
+    called with every line of output as it is read.
+    With check=True a RunError is raised unless the command succeeded.
+    """
+
+    import subprocess
+    if isinstance(argv, str):
+        raise TypeError("run() takes an argv list, not a shell command string")
+    result = Result(argv)
+    name = os.path.basename(result.argv[0])
+    started = time.time()
+    try:
+        process = subprocess.Popen(
+            result.argv, cwd=cwd, env=env, universal_newlines=True, bufsize=1,
+            stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as error:
+        result.returncode = NOT_FOUND
+        result.output.append(str(error))
+        if log:
+            _log("error", "could not start %s: %s" % (name, error), argv=result.argv)
+        if check:
+            raise RunError(result)
+        return result
+
+    reader = threading.Thread(target=_reader, args=(process.stdout, result, echo, log, name, on_line),
+                              name="mksec-runner-%s" % name)
+    reader.daemon = True
+    reader.start()
+    if stdin_data is not None:
+        try:
+            process.stdin.write(stdin_data)
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+
+    deadline = started + timeout if timeout else None
+    try:
+        while True:
+            try:
+                process.wait(POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if deadline is not None and time.time() >= deadline:
+                result.timed_out = True
+                _stop(process)
+                break
+            if cancel is not None and cancel.is_set():
+                result.cancelled = True
+                _stop(process)
+                break
+    except BaseException:
+        # control-c and friends, never leave the child behind
+        _stop(process)
+        raise
+
+    reader.join(KILL_GRACE)
+    result.returncode = process.returncode
+    result.duration = time.time() - started
+    if log:
+        _log("info" if result.ok else "error", "%s %s" % (name, result.describe()), argv=result.argv,
+             returncode=result.returncode, duration_ms=round(result.duration * 1000, 3))
+    if check and not result.ok:
+        raise RunError(result)
+    return result
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mksec-runner")
+        return _executor
+
+
+def run_async(argv, **kwargs):
+    # returns a Future whose result() is the Result of run(argv, **kwargs)
+    return _get_executor().submit(run, argv, **kwargs)
+
+
+def run_many(commands, **kwargs):
+    """
+    Runs independent commands concurrently and returns their Results in
+    the same order. Keyword arguments apply to every command.
+    """
+
+    futures = [run_async(argv, **kwargs) for argv in commands]
+    return [future.result() for future in futures]
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+#
+# Engagement scope index for MKSEC
+#
+# The allow and deny lists named by SCOPE_ALLOW_FILE / SCOPE_DENY_FILE in
+# set.config hold one entry per line: a single address, a CIDR prefix or a
+# first-last range, IPv4 or IPv6, with # comments. Every entry is reduced
+# to prefixes and stored in a binary radix trie per address family, so an
+# in-scope check walks at most 32 (or 128) bits no matter how many prefixes
+# the files contain. A deny match always wins; with no allow list at all
+# everything that is not denied is in scope. A scope file that is named in
+# set.config but cannot be read raises ScopeError, it never means "no list".
+#
+import os
+import threading
+
+from src.core.config_store import config
+
+# trie node layout, a list is a lot smaller than an object per node
+_ZERO, _ONE, _TERMINAL = 0, 1, 2
+
+# address width in bits per family
+WIDTH = {4: 32, 6: 128}
+
+
+class ScopeError(ValueError):
+    """ Raised for a scope file entry that is not an address, prefix or range. """
+
+
+def _parse_address(text):
+    import ipaddress
+    return ipaddress.ip_address(text.strip())
+
+
+def canonical_address(text):
+    """
+    The address text stands for, or None when it is not one (a hostname).
+    Every notation inet_aton takes (0x0a010203, 167837187, 10.1, 010.1.2.3)
+    is read the way the tools MKSEC hands it to would read it.
+    """
+
+    import ipaddress
+    import socket
+    from src.core import ip_validation
+    text = text.strip()
+    version, normalized = ip_validation.normalize(text)
+    if version is not None:
+        return ipaddress.ip_address(normalized)
+    try:
+        return ipaddress.IPv4Address(socket.inet_aton(text))
+    except (OSError, ValueError):
+        pass
+    try:
+        return ipaddress.ip_address(text)
+    except ValueError:
+        return None
+
+
+def parse_entry(entry):
+    """
+    Returns the list of ip_network prefixes an entry stands for.
+    Accepts 10.0.0.1, 10.0.0.0/8, 10.0.0.1-10.0.0.50 and the IPv6 forms.
+    """
+
+    import ipaddress
+    entry = entry.strip()
+    try:
+        if "-" in entry:
+            first, last = entry.split("-", 1)
+            first, last = _parse_address(first), _parse_address(last)
+            if first.version != last.version or first > last:
+                raise ValueError("bad range")
+            return list(ipaddress.summarize_address_range(first, last))
+        return [ipaddress.ip_network(entry, strict=False)]
+    except ValueError:
+        raise ScopeError("not an address, prefix or range: %r" % entry)
+
+
+def _fast_prefix(entry):
+    """
+    (version, value, length) for a plain address or CIDR, parsed with
+    inet_pton which is far cheaper than ipaddress for big scope files.
+    None for anything else (ranges, bad input), which parse_entry handles.
+    """
+
+    import socket
+    address, _, length = entry.strip().partition("/")
+    family, version = (socket.AF_INET6, 6) if ":" in address else (socket.AF_INET, 4)
+    try:
+        value = int.from_bytes(socket.inet_pton(family, address), "big")
+        length = int(length) if length else WIDTH[version]
+    except (OSError, ValueError):
+        return None
+    if not 0 <= length <= WIDTH[version]:
+        return None
+    return version, value, length
+
+
+class PrefixTrie:
+    """
+    Binary radix trie of prefixes for one address family.
+
+    Prefixes covered by an already stored shorter prefix are not stored,
+    and storing a shorter prefix drops everything underneath it, so the
+    trie stays as small as the set of prefixes allows.
+    """
+
+    def __init__(self, width):
+        self.width = width
+        self.root = [None, None, False]
+
+    def insert(self, value, length):
+        node = self.root
+        shift = self.width - 1
+        for _ in range(length):
+            if node[_TERMINAL]:
+                # already covered by a shorter prefix
+                return
+            bit = (value >> shift) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, False]
+            node = child
+            shift -= 1
+        if not node[_TERMINAL]:
+            node[_ZERO] = node[_ONE] = None
+            node[_TERMINAL] = True
+
+    def contains(self, value):
+        node = self.root
+        shift = self.width - 1
+        while node is not None:
+            if node[_TERMINAL]:
+                return True
+            node = node[(value >> shift) & 1]
+            shift -= 1
+        return False
+
+
+class ScopeIndex:
+    """ Addresses, prefixes and ranges of both families in two tries. """
+
+    def __init__(self, entries=()):
+        self.tries = dict((version, PrefixTrie(bits)) for version, bits in WIDTH.items())
+        self.entries = 0
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        prefix = _fast_prefix(entry)
+        if prefix is not None:
+            self.tries[prefix[0]].insert(prefix[1], prefix[2])
+        else:
+            for network in parse_entry(entry):
+                self.tries[network.version].insert(
+                    int(network.network_address), network.prefixlen)
+        self.entries += 1
+
+    def add_file(self, path):
+        with open(path, "r") as fileopen:
+            for number, line in enumerate(fileopen, 1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    self.add(line)
+                except ScopeError as error:
+                    raise ScopeError("%s:%d: %s" % (path, number, error))
+
+    def contains(self, address):
+        if not hasattr(address, "version"):
+            address = _parse_address(address)
+        return self.tries[address.version].contains(int(address))
+
+    def __contains__(self, address):
+        return self.contains(address)
+
+    def __len__(self):
+        return self.entries
+
+
+class Scope:
+    """
+    Allow and deny lists of an engagement.
+    """
+
+    def __init__(self, allow=None, deny=None):
+        self.allow = allow if allow is not None else ScopeIndex()
+        self.deny = deny if deny is not None else ScopeIndex()
+
+    @property
+    def active(self):
+        return bool(len(self.allow) or len(self.deny))
+
+    def in_scope(self, address):
+        """
+        True if the address may be targeted. Raises ValueError if it is not
+        an IP address at all (hostnames cannot be checked without DNS).
+        """
+
+        if not hasattr(address, "version"):
+            address = _parse_address(address)
+        # ::ffff:a.b.c.d reaches a.b.c.d, so it answers to the IPv4 lists too
+        mapped = getattr(address, "ipv4_mapped", None)
+        addresses = (address,) if mapped is None else (address, mapped)
+        if any(self.deny.contains(item) for item in addresses):
+            return False
+        if not len(self.allow):
+            return True
+        return any(self.allow.contains(item) for item in addresses)
+
+
+def _file_signature(path):
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def _load_index(signature):
+    index = ScopeIndex()
+    if signature is not None:
+        if signature[1] is None:
+            # configured but gone, an empty list would let everything through
+            raise ScopeError("scope file %s does not exist" % signature[0])
+        try:
+            index.add_file(signature[0])
+        except (IOError, OSError) as error:
+            raise ScopeError("could not read scope file %s: %s" % (signature[0], error))
+    return index
+
+
+_lock = threading.Lock()
+_cached = None
+_cached_key = None
+
+
+def configured():
+    # cheap check used before loading anything
+    return bool(config.get("SCOPE_ALLOW_FILE", "") or config.get("SCOPE_DENY_FILE", ""))
+
+
+def get_scope():
+    """
+    Scope built from the files named in set.config, rebuilt only when the
+    config entries or the files themselves change. Raises ScopeError when a
+    named file is missing or has a bad entry.
+    """
+
+    global _cached, _cached_key
+    allow_sig = _file_signature(config.get("SCOPE_ALLOW_FILE", ""))
+    deny_sig = _file_signature(config.get("SCOPE_DENY_FILE", ""))
+    key = (allow_sig, deny_sig)
+    with _lock:
+        if _cached is None or key != _cached_key:
+            _cached = Scope(_load_index(allow_sig), _load_index(deny_sig))
+            _cached_key = key
+        return _cached
+
+
+def in_scope(address):
+    return get_scope().in_scope(address)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    if len(sys.argv) < 2:
+        print("usage: python3 -m src.core.scope <address> [address ...]")
+        sys.exit(2)
+    started = time.time()
+    try:
+        scope = get_scope()
+    except ScopeError as error:
+        print("[!] %s" % error)
+        sys.exit(1)
+    print("[*] allow: %d entries, deny: %d entries, loaded in %.3fs" % (
+        len(scope.allow), len(scope.deny), time.time() - started))
+    for address in sys.argv[1:]:
+        canonical = canonical_address(address)
+        if canonical is None:
+            print("%s is not an IP address" % address)
+        else:
+            print("%s (%s) %s" % (address, canonical, "in scope" if scope.in_scope(canonical) else "OUT OF SCOPE"))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+#
+# Journaled key/value session state for MKSEC (~/.set/set.options)
+#
+# set.options stays a plain KEY=VALUE text file so modules that read it
+# directly keep working, but it is now treated as an append-only journal:
+# every update is a single appended line and the last line for a key wins.
+# An in-memory dict answers reads, and the journal is compacted back down
+# to one line per key once it grows well past the number of live keys.
+#
+import os
+import threading
+
+# first line of a fresh set.options, ignored when replaying the journal
+HEADER = "{This is the main MKSEC configuration file for all options used in MKSEC}"
+
+# compact once the journal holds this many times more lines than live keys
+COMPACT_RATIO = 4
+COMPACT_MIN_LINES = 64
+
+# bytes before the old end of the journal compared to tell a real append
+# from a rewrite in place that happens to make the file larger
+TAIL_CHECK = 128
+
+
+def _normalize(value):
+    # set.options values never keep their quotes
+    return value.replace('"', "")
+
+
+class SessionStore:
+    """
+    Exact-key session options backed by an append-only journal file.
+
+    Reads are dict lookups; writes append one line. If another process
+    rewrites or appends to the journal, the change is picked up on the
+    next access by comparing the file's inode, size and mtime. A larger
+    file only counts as appended to when its first line and the bytes just
+    before the old end are still the same; anything else is replayed in
+    full.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state_dir = os.path.dirname(path)
+        self._lock = threading.RLock()
+        self._data = {}
+        self._lines = 0
+        self._signature = None
+        # first line and last TAIL_CHECK bytes of the journal as last seen
+        self._head = None
+        self._tail = b""
+        self._handle = None
+        self._state_cache = {}
+
+    # journal replay
+
+    def _apply(self, text):
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("{") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            self._data[key.strip()] = _normalize(value)
+            self._lines += 1
+
+    def _seen(self, data, head=None):
+        # remembers what the journal looks like up to its current end
+        if head is not None:
+            self._head = head
+        self._tail = (self._tail + data)[-TAIL_CHECK:]
+
+    def _appended(self, fileopen, st):
+        # True if the file only grew at the end since it was last read
+        if self._signature is None or st.st_ino != self._signature[0] \
+                or st.st_size <= self._signature[1]:
+            return False
+        if fileopen.readline() != self._head:
+            return False
+        fileopen.seek(self._signature[1] - len(self._tail))
+        return fileopen.read(len(self._tail)) == self._tail
+
+    def _sync(self):
+        # caller holds the lock
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._data, self._lines, self._signature = {}, 0, None
+            self._head, self._tail = None, b""
+            self._close()
+            return
+        signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if signature == self._signature:
+            return
+        with open(self.path, "rb") as fileopen:
+            if self._appended(fileopen, st):
+                # someone appended, only replay the new tail
+                offset = self._signature[1]
+                fileopen.seek(offset)
+                data = fileopen.read()
+                self._seen(data)
+            else:
+                self._data, self._lines, offset = {}, 0, 0
+                self._close()
+                data = fileopen.read()
+                self._tail = b""
+                self._seen(data, data.partition(b"\n")[0] + b"\n")
+            mtime = os.fstat(fileopen.fileno()).st_mtime_ns
+        self._apply(data.decode("utf-8", "replace"))
+        # exactly what was replayed, a line added meanwhile is read next time
+        self._signature = (st.st_ino, offset + len(data), mtime)
+
+    def _close(self):
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except (IOError, OSError):
+                pass
+            self._handle = None
+
+    def _append(self, line):
+        if self._handle is None:
+            if not os.path.isdir(self.state_dir):
+                os.makedirs(self.state_dir)
+            self._handle = open(self.path, "a")
+        # one write per record so concurrent appenders never interleave lines
+        record = line + "\n"
+        data = record.encode("utf-8")
+        self._handle.write(record)
+        self._handle.flush()
+        st = os.fstat(self._handle.fileno())
+        ino, size = self._signature[:2] if self._signature is not None else (st.st_ino, 0)
+        if st.st_ino == ino and st.st_size == size + len(data):
+            # nothing but our record since the last sync
+            self._seen(data, data if self._head is None else None)
+            self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        # otherwise another process appended meanwhile; the stale signature
+        # makes the next _sync() replay the gap, our record included
+
+    def _write_all(self, header=HEADER):
+        # caller holds the lock, rewrites the journal atomically
+        if not os.path.isdir(self.state_dir):
+            os.makedirs(self.state_dir)
+        self._close()
+        tmp_path = "%s.tmp-%d" % (self.path, os.getpid())
+        data = (header + "\n" + "".join("%s=%s\n" % item for item in self._data.items())).encode("utf-8")
+        with open(tmp_path, "wb") as filewrite:
+            filewrite.write(data)
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self._tail = b""
+        self._seen(data, (header + "\n").encode("utf-8"))
+        self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        self._lines = len(self._data)
+
+    # public api
+
+    def get(self, key, default=None):
+        if key.endswith("="):
+            key = key[:-1]
+        with self._lock:
+            self._sync()
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        if key.endswith("="):
+            key = key[:-1]
+        key = key.strip()
+        # stored the way a replay of the journal would read it back
+        value = _normalize(str(value).replace("\n", " "))
+        with self._lock:
+            self._sync()
+            self._data[key] = value
+            self._append("%s=%s" % (key, value))
+            self._lines += 1
+            if self._lines > max(COMPACT_MIN_LINES, COMPACT_RATIO * len(self._data)):
+                self.compact()
+
+    def update(self, option):
+        # takes the legacy "KEY=VALUE" form used by update_options()
+        key, _, value = option.partition("=")
+        self.set(key.strip(), value)
+
+    def items(self):
+        with self._lock:
+            self._sync()
+            return dict(self._data)
+
+    def compact(self):
+        with self._lock:
+            self._sync()
+            self._write_all()
+
+    def reset(self):
+        # start a fresh session with an empty journal
+        with self._lock:
+            self._data = {}
+            self._state_cache = {}
+            self._write_all()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    # small per-session state files (attack_vector, interface, site.template ...)
+    # that other modules read straight from ~/.set
+
+    def write_state(self, name, data):
+        path = os.path.join(self.state_dir, name)
+        tmp_path = "%s.tmp-%d" % (path, os.getpid())
+        with self._lock:
+            if not os.path.isdir(self.state_dir):
+                os.makedirs(self.state_dir)
+            with open(tmp_path, "w") as filewrite:
+                filewrite.write(data)
+            os.replace(tmp_path, path)
+            self._state_cache[name] = (os.stat(path).st_mtime_ns, data)
+
+    def read_state(self, name, default=None):
+        path = os.path.join(self.state_dir, name)
+        with self._lock:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self._state_cache.pop(name, None)
+                return default
+            cached = self._state_cache.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            with open(path, "r") as fileopen:
+                data = fileopen.read()
+            self._state_cache[name] = (mtime, data)
+            return data
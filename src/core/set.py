@@ -3,8 +3,10 @@ import shutil
 import os
 import re
 import sys
-import socket
+from src.core import capabilities
+from src.core import import_manager
 from src.core.core_mksec import *
+from src.core.config_store import config
 from src.core.menu import text
 
 try:
@@ -18,7 +20,7 @@ me = mod_name()
 # define path and set it to the MKSEC root dir
 
 definepath = os.getcwd()
-sys.path.append(definepath)
+import_manager.add_root(definepath)
 
 # root check
 
@@ -27,7 +29,7 @@ operating_system = check_os()
 check_os()
 
 if operating_system == "posix":
-    if os.geteuid() != 0:
+    if not capabilities.is_root():
         print("\n MK Security (MKSEC) - by Mert Karagoz (generatorexit)")
         print("\n Not running as root. \n\nExiting the MK Security (MKSEC).\n")
         sys.exit(1)
@@ -47,6 +49,10 @@ try:
         if main_menu_choice == 'exit':
             break
 
+        if main_menu_choice == 'jobs':
+            jobs_menu()
+            continue
+
         if operating_system == "windows" == False:
             if main_menu_choice == "1" or main_menu_choice == "4" or main_menu_choice == "8" or main_menu_choice == "3":
                 print_warning(
@@ -75,23 +81,14 @@ try:
 
                     # Spearphish menu choice 1: Perform a Mass Email Attack
                     if spearphish_menu_choice == '1':
-                        sys.path.append(definepath + "/src/core/msf_attacks/")
                         debug_msg(
                             me, "importing 'src.core.msf_attacks.create_payload'", 1)
-                        try:
-                            module_reload(create_payload)
-                        except:
-                            pass
-                        import create_payload
+                        import_manager.run("create_payload", "src/core/msf_attacks")
                     # Spearphish menu choice 2: Create a FileFormat Payload
                     if spearphish_menu_choice == '2':
-                        sys.path.append(definepath + "/src/core/msf_attacks/")
                         debug_msg(
                             me, "importing 'src.core.msf_attacks.create_payload'", 1)
-                        try:
-                            reload(create_payload)
-                        except:
-                            import create_payload
+                        import_manager.run("create_payload", "src/core/msf_attacks")
                     # Spearphish menu choice 3: Create a Social-Engineering
                     # Template
                     if spearphish_menu_choice == '3':
@@ -178,9 +175,6 @@ try:
                     break
 
                 try:
-                    # write our attack vector to file to be called later
-                    filewrite = open(userconfigpath + "attack_vector", "w")
-
                     # webjacking and web templates are not allowed
                     if attack_vector == "5" and choice3 == "1":
                         print(bcolors.RED + "\n Sorry, you can't use the Web Jacking vector with Web Templates." + bcolors.ENDC)
@@ -207,108 +201,88 @@ try:
                     # specify java applet attack
                     if attack_vector == '1':
                         attack_vector = "java"
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        session.write_state("attack_vector", attack_vector)
 
                     # specify browser exploits
                     if attack_vector == '2':
                         attack_vector = "browser"
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        session.write_state("attack_vector", attack_vector)
 
                     if attack_vector == '':
                         attack_vector = '3'
                     # specify web harvester method
                     if attack_vector == '3':
                         attack_vector = "harvester"
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        session.write_state("attack_vector", attack_vector)
                         print_info("Credential harvester will allow you to utilize the clone capabilities within SET")
                         print_info("to harvest credentials or parameters from a website as well as place them into a report")
 
                     # specify tab nabbing attack vector
                     if attack_vector == '4':
                         attack_vector = "tabnabbing"
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        session.write_state("attack_vector", attack_vector)
 
                     # specify webjacking attack vector
                     if attack_vector == "5":
                         attack_vector = "webjacking"
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        session.write_state("attack_vector", attack_vector)
 
                     # specify Multi-Attack Vector
                     attack_vector_multi = ""
                     if attack_vector == '6':
                         # trigger the multiattack flag in SET
                         attack_vector = "multiattack"
-                        # write the attack vector to file
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        # write the attack vector to the session state
+                        session.write_state("attack_vector", attack_vector)
 
                     # hta attack vector
                     if attack_vector == '7':
                         # call hta attack vector
                         attack_vector = "hta"
-                        filewrite.write(attack_vector)
-                        filewrite.close()
+                        session.write_state("attack_vector", attack_vector)
 
                     # pull ip address
                     if choice3 != "-1":
-                        fileopen = open(
-                            "/etc/setoolkit/set.config", "r").readlines()
-                        for line in fileopen:
-                            line = line.rstrip()
-                            match = re.search("AUTO_DETECT=ON", line)
-                            if match:
-                                try:
-                                    ipaddr = socket.socket(
-                                        socket.AF_INET, socket.SOCK_DGRAM)
-                                    ipaddr.connect(('google.com', 0))
-                                    ipaddr.settimeout(2)
-                                    ipaddr = ipaddr.getsockname()[0]
-                                    update_options("IPADDR=" + ipaddr)
-                                except Exception as error:
-                                    log(error)
-                                    ipaddr = raw_input(
-                                        setprompt(["2"], "Your interface IP Address"))
-                                    update_options("IPADDR=" + ipaddr)
+                        auto_detect = config.get("AUTO_DETECT")
+                        if auto_detect == "ON":
+                            try:
+                                # egress interface address, no DNS lookup
+                                ipaddr = detect_public_ip()
+                                update_options("IPADDR=" + ipaddr)
+                            except Exception as error:
+                                log(error)
+                                ipaddr = ip_prompt(["2"], "Your interface IP Address")
+                                update_options("IPADDR=" + ipaddr)
 
                         # if AUTO_DETECT=OFF prompt for IP Address
-                        for line in fileopen:
-                            line = line.rstrip()
-                            match = re.search("AUTO_DETECT=OFF", line)
-                            if match:
-                                if attack_vector != "harvester":
-                                    if attack_vector != "tabnabbing":
-                                        if attack_vector != "webjacking":
-                                            if attack_vector != "hta":
-                                                # this part is to determine if NAT/port forwarding is used
-                                                # if it is it'll prompt for
-                                                # additional questions
-                                                print_info("NAT/Port Forwarding can be used in the cases where your SET machine is")
-                                                print_info("not externally exposed and may be a different IP address than your reverse listener.")
-                                                nat_or_fwd = yesno_prompt('0', 'Are you using NAT/Port Forwarding [yes|no]')
-                                                if nat_or_fwd == "YES":
-                                                    ipquestion = raw_input(setprompt(["2"], "IP address to SET web server (this could be your external IP or hostname)"))
-                                                    filewrite2 = open(userconfigpath + "interface", "w")
-                                                    filewrite2.write(ipquestion)
-                                                    filewrite2.close()
-                                                    # is your payload/listener
-                                                    # on a different IP?
-                                                    natquestion = yesno_prompt(["2"], "Is your payload handler (metasploit) on a different IP from your external NAT/Port FWD address [yes|no]")
-                                                    if natquestion == 'YES':
-                                                        ipaddr = raw_input(setprompt(["2"], "IP address for the reverse handler (reverse payload)"))
-                                                    if natquestion == "NO":
-                                                        ipaddr = ipquestion
-                                                # if you arent using NAT/Port
-                                                # FWD
-                                                if nat_or_fwd == "NO":
-                                                    ipaddr = grab_ipaddress()
-
-                                if attack_vector == "harvester" or attack_vector == "tabnabbing" or attack_vector == "webjacking":
-                                    print("""
+                        if auto_detect == "OFF":
+                            if attack_vector != "harvester":
+                                if attack_vector != "tabnabbing":
+                                    if attack_vector != "webjacking":
+                                        if attack_vector != "hta":
+                                            # this part is to determine if NAT/port forwarding is used
+                                            # if it is it'll prompt for
+                                            # additional questions
+                                            print_info("NAT/Port Forwarding can be used in the cases where your SET machine is")
+                                            print_info("not externally exposed and may be a different IP address than your reverse listener.")
+                                            nat_or_fwd = yesno_prompt('0', 'Are you using NAT/Port Forwarding [yes|no]')
+                                            if nat_or_fwd == "YES":
+                                                ipquestion = ip_prompt(["2"], "IP address to SET web server (this could be your external IP or hostname)")
+                                                session.write_state("interface", ipquestion)
+                                                # is your payload/listener
+                                                # on a different IP?
+                                                natquestion = yesno_prompt(["2"], "Is your payload handler (metasploit) on a different IP from your external NAT/Port FWD address [yes|no]")
+                                                if natquestion == 'YES':
+                                                    ipaddr = ip_prompt(["2"], "IP address for the reverse handler (reverse payload)")
+                                                if natquestion == "NO":
+                                                    ipaddr = ipquestion
+                                            # if you arent using NAT/Port
+                                            # FWD
+                                            if nat_or_fwd == "NO":
+                                                ipaddr = grab_ipaddress()
+
+                            if attack_vector == "harvester" or attack_vector == "tabnabbing" or attack_vector == "webjacking":
+                                print("""
 -------------------------------------------------------------------------------
 --- * IMPORTANT * READ THIS BEFORE ENTERING IN THE IP ADDRESS * IMPORTANT * ---
 
@@ -328,20 +302,20 @@ this from an external perspective, it will not work. This isn't a SET issue
 this is how networking works.
 """)
 
-                                    try:
-                                        revipaddr = detect_public_ip()
-                                        ipaddr = raw_input(setprompt(["2"], "IP address for the POST back in Harvester/Tabnabbing [" + revipaddr + "]"))
-                                        if ipaddr == "": ipaddr=revipaddr
-                                    except Exception:
-                                        rhost = raw_input("Enter the IP address for POST back in Harvester/Tabnabbing: ")
-                                        ipaddr = rhost
-
-                                if check_options("IPADDR=") != 0:
-                                    ipaddr = check_options("IPADDR=")
+                                try:
+                                    revipaddr = detect_public_ip()
+                                    ipaddr = ip_prompt(["2"], "IP address for the POST back in Harvester/Tabnabbing [" + revipaddr + "]")
+                                    if ipaddr == "": ipaddr=revipaddr
+                                except Exception:
+                                    rhost = ip_prompt("0", "Enter the IP address for POST back in Harvester/Tabnabbing")
+                                    ipaddr = rhost
+
+                            if check_options("IPADDR=") != 0:
+                                ipaddr = check_options("IPADDR=")
+                                update_options("IPADDR=" + ipaddr)
+                            else:
+                                if ipaddr != "":
                                     update_options("IPADDR=" + ipaddr)
-                                else:
-                                    if ipaddr != "":
-                                        update_options("IPADDR=" + ipaddr)
 
                         # if java applet attack
                         if attack_vector == "java":
@@ -351,36 +325,22 @@ this is how networking works.
                     if choice3 == '1':
 
                             # get the template ready
-                        sys.path.append(definepath + "/src/html/templates")
                         debug_msg(me, "importing src.html.templates.template'", 1)
-                        try:
-                            module_reload(template)
-                        except:
-                            import template
+                        import_manager.run("template", "src/html/templates")
 
                         # grab browser exploit selection
                         if attack_vector == "browser":
                                 # grab clientattack
-                            sys.path.append(
-                                definepath + "/src/webattack/browser_exploits")
                             debug_msg(me, "line 357: importing 'src.webattack.browser_exploits.gen_payload'", 1)
-                            try:
-                                module_reload(gen_payload)
-                            except:
-                                import gen_payload
+                            import_manager.run("gen_payload", "src/webattack/browser_exploits")
 
                         # arp cache attack, will exit quickly
                         # if not in config file
-                        sys.path.append(definepath + "/src/core/arp_cache")
                         debug_msg(me, "line 364: importing 'src.core.arp_cache.arp'", 1)
-                        try:
-                            module_reload(arp)
-                        except:
-                            import arp
+                        import_manager.run("arp", "src/core/arp_cache")
 
                         # actual website attack here
                         # web_server.py is main core
-                        sys.path.append(definepath + "/src/html/")
 
                         # clean up stale file
                         if os.path.isfile(userconfigpath + "cloner.failed"):
@@ -389,18 +349,12 @@ this is how networking works.
                         site_cloned = True
 
                         debug_msg(me, "line 375: importing 'src.webattack.web_clone.cloner'", 1)
-                        try:
-                            module_reload(src.webattack.web_clone.cloner)
-                        except:
-                            import src.webattack.web_clone.cloner
+                        import_manager.run("src.webattack.web_clone.cloner")
 
                         # grab java applet attack
                         if attack_vector == "java":
                             debug_msg(me, "importing 'src.core.payloadgen.create_payloads'", 1)
-                            try:
-                                module_reload(src.core.payloadgen.create_payloads)
-                            except:
-                                import src.core.payloadgen.create_payloads
+                            import_manager.run("src.core.payloadgen.create_payloads")
 
                         if os.path.isfile(userconfigpath + "cloner.failed"):
                             site_cloned = False
@@ -412,19 +366,11 @@ this is how networking works.
                                 if attack_vector == "tabnabbing" or attack_vector == "webjacking":
                                     debug_msg(
                                         me, "importing 'src.webattack.tabnabbing.tabnabbing'", 1)
-                                    try:
-                                        module_reload(src.webattack.tabnabbing)
-                                    except:
-                                        import src.webattack.tabnabbing
+                                    import_manager.run("src.webattack.tabnabbing")
                                 # start web cred harvester here
                                 debug_msg(
                                     me, "importing 'src.webattack.harvester.harvester'", 1)
-                                sys.path.append(
-                                    definepath + "/src/webattack/harvester/")
-                                try:
-                                    module_reload(harvester)
-                                except:
-                                    import harvester
+                                import_manager.run("harvester", "src/webattack/harvester")
 
                             # if we are using profiler lets prep everything to
                             # get ready
@@ -443,7 +389,7 @@ this is how networking works.
                                 gen_hta_cool_stuff()
                                 attack_vector = "hta"
                                 print_status("Automatically starting Apache for you...")
-                                subprocess.Popen("service apache2 start", shell=True).wait()
+                                start_apache()
 
                             if attack_vector != "harvester":
                                 if attack_vector != "tabnabbing":
@@ -455,7 +401,7 @@ this is how networking works.
                                                         # spawn web server here
                                                         debug_msg(
                                                             me, "importing 'src.html.spawn'", 1)
-                                                        import src.html.spawn
+                                                        import_manager.run("src.html.spawn")
 
                             # multi attack vector here
                             if attack_vector == "multiattack":
@@ -469,18 +415,12 @@ this is how networking works.
                                         pass
                                     debug_msg(
                                         me, "importing 'src.webattack.multi_attack.multiattack'", 1)
-                                    import src.webattack.multi_attack.multiattack
+                                    import_manager.run("src.webattack.multi_attack.multiattack")
 
                     # Create a website clone
                     if choice3 == '2':
                         # flag that we want a custom website
                         definepath = os.getcwd()
-                        sys.path.append(
-                            definepath + "/src/webattack/web_clone/")
-                        if os.path.isfile(userconfigpath + "site.template"):
-                            os.remove(userconfigpath + "site.template")
-                        filewrite = open(userconfigpath + "site.template", "w")
-                        filewrite.write("TEMPLATE=CUSTOM")
                         print_info("SET supports both HTTP and HTTPS")
                         # specify the site to clone
                         print_info("Example: http://www.thisisafakesite.com")
@@ -501,8 +441,7 @@ this is how networking works.
                         if match3:
                             URL = ("https://accounts.google.com")
 
-                        filewrite.write("\nURL=%s" % (URL))
-                        filewrite.close()
+                        session.write_state("site.template", "TEMPLATE=CUSTOM\nURL=%s" % (URL))
 
                         # launch HTA attack vector after the website has been
                         # cloned
@@ -516,20 +455,14 @@ this is how networking works.
                             attack_vector = "hta"
                             print_status(
                                 "Automatically starting Apache for you...")
-                            subprocess.Popen(
-                                "service apache2 start", shell=True).wait()
+                            start_apache()
 
                         # grab browser exploit selection
                         if attack_vector == "browser":
                             # grab clientattack
-                            sys.path.append(
-                                definepath + "/src/webattack/browser_exploits")
                             debug_msg(
                                 me, "importing 'src.webattack.browser_exploits.gen_payload'", 1)
-                            try:
-                                module_reload(gen_payload)
-                            except:
-                                import gen_payload
+                            import_manager.run("gen_payload", "src/webattack/browser_exploits")
 
                         # set site cloner to true
                         site_cloned = True
@@ -540,10 +473,7 @@ this is how networking works.
                             site_cloned = True
                             debug_msg(
                                 me, "importing 'src.webattack.web_clone.cloner'", 1)
-                            try:
-                                module_reload(src.webattack.web_clone.cloner)
-                            except:
-                                import src.webattack.web_clone.cloner
+                            import_manager.run("src.webattack.web_clone.cloner")
 
                             if os.path.isfile(userconfigpath + "cloner.failed"):
                                 site_cloned = False
@@ -554,53 +484,30 @@ this is how networking works.
                                 # import our payload generator
                                 debug_msg(
                                     me, "importing 'src.core.payloadgen.create_payloads'", 1)
-                                try:
-                                    module_reload(
-                                        src.core.payloadgen.create_payloads)
-                                except:
-                                    import src.core.payloadgen.create_payloads
+                                import_manager.run("src.core.payloadgen.create_payloads")
 
                             # arp cache if applicable
                             definepath = os.getcwd()
-                            sys.path.append(definepath + "/src/core/arp_cache")
                             debug_msg(
                                 me, "line 500: importing 'src.core.arp_cache.arp'", 1)
-                            try:
-                                module_reload(arp)
-                            except:
-                                import arp
+                            import_manager.run("arp", "src/core/arp_cache")
 
                             # tabnabbing and harvester selection here
                             if attack_vector == "harvester" or attack_vector == "tabnabbing" or attack_vector == "webjacking":
                                 if attack_vector == "tabnabbing" or attack_vector == "webjacking":
-                                    sys.path.append(
-                                        definepath + "/src/webattack/tabnabbing")
                                     debug_msg(
                                         me, "importing 'src.webattack.tabnabbing.tabnabbing'", 1)
-                                    try:
-                                        module_reload(tabnabbing)
-                                    except:
-                                        import tabnabbing
-                                sys.path.append(
-                                    definepath + "/src/webattack/harvester")
+                                    import_manager.run("tabnabbing", "src/webattack/tabnabbing")
                                 debug_msg(
                                     me, "importing 'src.webattack.harvester.harvester'", 1)
 
-                                try:
-                                    module_reload(harvester)
-                                except:
-                                    import harvester
+                                import_manager.run("harvester", "src/webattack/harvester")
 
                             # multi_attack vector here
                             if attack_vector == "multiattack":
-                                sys.path.append(
-                                    definepath + "/src/webattack/multi_attack/")
                                 debug_msg(
                                     me, "importing 'src.webattack.multi_attack.multiattack'", 1)
-                                try:
-                                    module_reload(multiattack)
-                                except:
-                                    import multiattack
+                                import_manager.run("multiattack", "src/webattack/multi_attack")
 
                             # if we arent using credential harvester or
                             # tabnabbing
@@ -609,24 +516,13 @@ this is how networking works.
                                     if attack_vector != "multiattack":
                                         if attack_vector != "webjacking":
                                             if attack_vector != "hta":
-                                                sys.path.append(
-                                                    definepath + "/src/html")
                                                 debug_msg(
                                                     me, "importing 'src.html.spawn'", 1)
-                                                try:
-                                                    module_reload(spawn)
-                                                except:
-                                                    import spawn
+                                                import_manager.run("spawn", "src/html")
 
                     # Import your own site
                     if choice3 == '3':
 
-                        sys.path.append(
-                            definepath + "/src/webattack/web_clone/")
-                        if os.path.isfile(userconfigpath + "site.template"):
-                            os.remove(userconfigpath + "site.template")
-                        filewrite = open(userconfigpath + "site.template", "w")
-                        filewrite.write("TEMPLATE=SELF")
                         # specify the site to clone
                         if not os.path.isdir(userconfigpath + "web_clone"):
                             os.makedirs(userconfigpath + "web_clone")
@@ -673,15 +569,14 @@ this is how networking works.
                                         sys.exit()
                                 copyfolder(URL, "%s/web_clone/" % userconfigpath)
 
-                        filewrite.write("\nURL=%s" % (URL))
-                        filewrite.close()
+                        session.write_state("site.template", "TEMPLATE=SELF\nURL=%s" % (URL))
 
                         # if not harvester then load up cloner
                         if attack_vector == "java" or attack_vector == "browser":
                             # import our website cloner
                             debug_msg(
                                 me, "importing 'src.webattack.web_clone.cloner'", 1)
-                            import src.webattack.web_clone.cloner
+                            import_manager.run("src.webattack.web_clone.cloner")
 
                         # launch HTA attack vector after the website has been
                         # cloned
@@ -695,8 +590,7 @@ this is how networking works.
                             attack_vector = "hta"
                             print_status(
                                 "Automatically starting Apache for you...")
-                            subprocess.Popen(
-                                "service apache2 start", shell=True).wait()
+                            start_apache()
 
                         # if java applet attack
                         if attack_vector == "java":
@@ -704,38 +598,25 @@ this is how networking works.
 
                             debug_msg(
                                 me, "importing 'src.core.payloadgen.create_payloads'", 1)
-                            import src.core.payloadgen.create_payloads
+                            import_manager.run("src.core.payloadgen.create_payloads")
 
                         # grab browser exploit selection
                         if attack_vector == "browser":
                             # grab clientattack
-                            sys.path.append(
-                                definepath + "/src/webattack/browser_exploits")
                             debug_msg(
                                 me, "importing 'src.webattack.browser_exploits.gen_payload'", 1)
-                            try:
-                                module_reload(gen_payload)
-                            except:
-                                import gen_payload
+                            import_manager.run("gen_payload", "src/webattack/browser_exploits")
 
                         # arp cache if applicable
-                        sys.path.append(definepath + "/src/core/arp_cache")
                         debug_msg(
                             me, "line 592: importing 'src.core.arp_cache.arp'", 1)
-                        try:
-                            module_reload(arp)
-                        except:
-                            import arp
+                        import_manager.run("arp", "src/core/arp_cache")
 
                         # if not harvester spawn server
                         if attack_vector == "java" or attack_vector == "browser":
                                 # import web_server and do magic
-                            sys.path.append(definepath + "/src/html")
                             debug_msg(me, "importing 'src.html.spawn'", 1)
-                            try:
-                                module_reload(spawn)
-                            except:
-                                import spawn
+                            import_manager.run("spawn", "src/html")
 
                         # cred harvester for auto site here
                         if attack_vector == "harvester":
@@ -748,19 +629,12 @@ this is how networking works.
                             if not match:
                                 if not match1:
                                     URL = ("http://" + URL)
-                            filewrite = open(userconfigpath + "site.template", "w")
-                            filewrite.write("\nURL=%s" % (URL))
-                            filewrite.close()
+                            session.write_state("site.template", "\nURL=%s" % (URL))
 
                             # start web cred harvester here
-                            sys.path.append(
-                                definepath + "/src/webattack/harvester")
                             debug_msg(
                                 me, "importing 'src.webattack.harvester.harvester'", 1)
-                            try:
-                                module_reload(harvester)
-                            except:
-                                import harvester
+                            import_manager.run("harvester", "src/webattack/harvester")
 
                         # tabnabbing for auto site here
                         if attack_vector == "tabnabbing" or attack_vector == "webjacking":
@@ -773,28 +647,16 @@ this is how networking works.
                             if not match:
                                 if not match1:
                                     URL = ("http://" + URL)
-                            filewrite = open(userconfigpath + "site.template", "w")
-                            filewrite.write("\nURL=%s" % (URL))
-                            filewrite.close()
+                            session.write_state("site.template", "\nURL=%s" % (URL))
                             # start tabnabbing here
-                            sys.path.append(
-                                definepath + "/src/webattack/tabnabbing")
                             debug_msg(
                                 me, "importing 'src.webattack.tabnabbing.tabnabbing'", 1)
-                            try:
-                                module_reload(tabnabbing)
-                            except:
-                                import tabnabbing
+                            import_manager.run("tabnabbing", "src/webattack/tabnabbing")
 
                             # start web cred harvester here
-                            sys.path.append(
-                                definepath + "/src/webattack/harvester")
                             debug_msg(
                                 me, "importing 'src.webattack.harvester.harvester'", 1)
-                            try:
-                                module_reload(harvester)
-                            except:
-                                import harvester
+                            import_manager.run("harvester", "src/webattack/harvester")
 
                         # multi attack vector here
                         if attack_vector == "multiattack":
@@ -807,7 +669,7 @@ this is how networking works.
                                 pass
                             debug_msg(
                                 me, "importing 'src.webattack.multi_attack.multiattack'", 1)
-                            import src.webattack.multi_attack.multiattack
+                            import_manager.run("src.webattack.multi_attack.multiattack")
 
                     # Return to main menu
                     if choice3 == '4':
@@ -841,42 +703,27 @@ this is how networking works.
 
             # if fileformat
             if infectious_menu_choice == "1":
-                ipaddr = raw_input(
-                    setprompt(["3"], "IP address for the reverse connection (payload)"))
+                ipaddr = ip_prompt(["3"], "IP address for the reverse connection (payload)")
                 update_options("IPADDR=" + ipaddr)
 
-            filewrite1 = open(userconfigpath + "payloadgen", "w")
-            filewrite1.write("payloadgen=solo")
-            filewrite1.close()
+            session.write_state("payloadgen", "payloadgen=solo")
 
             # if choice is file-format
             if infectious_menu_choice == "1":
-                filewrite = open(userconfigpath + "fileformat.file", "w")
-                filewrite.write("fileformat=on")
-                filewrite.close()
-                sys.path.append(definepath + "/src/core/msf_attacks/")
+                session.write_state("fileformat.file", "fileformat=on")
                 debug_msg(
                     me, "importing 'src.core.msf_attacks.create_payload'", 1)
-                try:
-                    module_reload(create_payload)
-                except:
-                    import create_payload
+                import_manager.run("create_payload", "src/core/msf_attacks")
 
             # if choice is standard payload
             if infectious_menu_choice == "2":
                 # trigger set options for infectious media
                 update_options("INFECTION_MEDIA=ON")
-                try:
-                    import src.core.payloadgen.solo
-                except:
-                    module_reload(src.core.payloadgen.solo)
+                import_manager.run("src.core.payloadgen.solo")
 
             # if we aren't exiting, then launch autorun
             if infectious_menu_choice != "99":
-                try:
-                    import src.autorun.autolaunch
-                except:
-                    module_reload(src.autorun.autolaunch)
+                import_manager.run("src.autorun.autolaunch")
 
         #
         #
@@ -885,9 +732,7 @@ this is how networking works.
         #
         if main_menu_choice == '4':
             update_options("PAYLOADGEN=SOLO")
-            import src.core.payloadgen.solo
-            # try: import src.core.payloadgen.solo
-            # except: module_reload(src.core.payloadgen.solo)
+            import_manager.run("src.core.payloadgen.solo")
             # if the set payload is there
             if os.path.isfile(userconfigpath + "msf.exe"):
                 shutil.copyfile(userconfigpath + "msf.exe", "payload.exe")
@@ -896,10 +741,7 @@ this is how networking works.
         # Main Menu choice 5: Mass Mailer Attack
         if main_menu_choice == '5':
             debug_msg(me, "importing 'src.phishing.smtp.client.smtp_web'", 1)
-            try:
-                module_reload(src.phishing.smtp.client.smtp_web)
-            except:
-                import src.phishing.smtp.client.smtp_web
+            import_manager.run("src.phishing.smtp.client.smtp_web")
 
         # Main Menu choice 6: Teensy USB HID Attack Vector
         if main_menu_choice == '6':
@@ -918,47 +760,33 @@ this is how networking works.
             yes_or_no = ''
 
             if teensy_menu_choice != "99":
-                # set our teensy info file in program junk
-                filewrite = open(userconfigpath + "teensy", "w")
-                filewrite.write(teensy_menu_choice + "\n")
+                # set our teensy info in the session state
+                teensy_state = teensy_menu_choice + "\n"
                 if teensy_menu_choice != "3" and teensy_menu_choice != "7" and teensy_menu_choice != "8" and teensy_menu_choice != "9" and teensy_menu_choice != "10" and teensy_menu_choice != "11" and teensy_menu_choice != "12" and teensy_menu_choice != "13" and teensy_menu_choice != "14":
                     yes_or_no = yesno_prompt(
                         "0", "Do you want to create a payload and listener [yes|no]: ")
                     if yes_or_no == "YES":
-                        filewrite.write("payload")
-                        filewrite.close()
+                        session.write_state("teensy", teensy_state + "payload")
                         # load a payload
-                        sys.path.append(definepath + "/src/core/payloadgen")
                         debug_msg(
                             me, "importing 'src.core.payloadgen.create_payloads'", 1)
-                        try:
-                            module_reload(create_payloads)
-                        except:
-                            import create_payloads
-                if yes_or_no == "NO":
-                    filewrite.close()
+                        import_manager.run("create_payloads", "src/core/payloadgen")
+                if yes_or_no != "YES":
+                    session.write_state("teensy", teensy_state)
                 # need these default files for web server load
-                filewrite = open(userconfigpath + "site.template", "w")
-                filewrite.write("TEMPLATE=CUSTOM")
-                filewrite.close()
-                filewrite = open(userconfigpath + "attack_vector", "w")
-                filewrite.write("hid")
-                filewrite.close()
+                session.write_state("site.template", "TEMPLATE=CUSTOM")
+                session.write_state("attack_vector", "hid")
                 # if we are doing binary2teensy
                 if teensy_menu_choice != "7" and teensy_menu_choice != "8" and teensy_menu_choice != "9" and teensy_menu_choice != "10" and teensy_menu_choice != "11" and teensy_menu_choice != "12" and teensy_menu_choice != "14":
-                    sys.path.append(definepath + "/src/teensy")
                     debug_msg(me, "importing 'src.teensy.teensy'", 1)
-                    try:
-                        module_reload(teensy)
-                    except:
-                        import teensy
+                    import_manager.run("teensy", "src/teensy")
                 if teensy_menu_choice == "7":
                     debug_msg(me, "importing 'src.teensy.binary2teensy'", 1)
-                    import src.teensy.binary2teensy
+                    import_manager.run("src.teensy.binary2teensy")
                 # if we are doing sd2teensy attack
                 if teensy_menu_choice == "8":
                     debug_msg(me, "importing 'src.teensy.sd2teensy'", 1)
-                    import src.teensy.sd2teensy
+                    import_manager.run("src.teensy.sd2teensy")
 
                 # if we are doing the sd2teensy osx attack
                 if teensy_menu_choice == "9":
@@ -1006,7 +834,7 @@ this is how networking works.
                         "Generating the Powershell - Shellcode injection ino..")
                     debug_msg(
                         me, "importing 'src.teensy.powershell_shellcode'", 1)
-                    import src.teensy.powershell_shellcode
+                    import_manager.run("src.teensy.powershell_shellcode")
 
 		# HID Msbuild compile to memory Shellcode Attack
                 if teensy_menu_choice == "14":
@@ -1014,7 +842,7 @@ this is how networking works.
                         "HID Msbuild compile to memory Shellcode Attack selected")
                     debug_msg(
                         me, "importing '-----file-----'", 1)
-                    import src.teensy.ino_gen
+                    import_manager.run("src.teensy.ino_gen")
 
             if teensy_menu_choice == "99":
                 teensy_menu_choice = None
@@ -1031,42 +859,23 @@ this is how networking works.
 
             if operating_system != "windows":
 
-                # set path to nothing
-                airbase_path = ""
-                dnsspoof_path = ""
-                # need to pull the SET config file
-                fileopen = open("/etc/setoolkit/set.config", "r")
-                for line in fileopen:
-                    line = line.rstrip()
-                    match = re.search("AIRBASE_NG_PATH=", line)
-                    if match:
-                        airbase_path = line.replace("AIRBASE_NG_PATH=", "")
-
-                    match1 = re.search("DNSSPOOF_PATH=", line)
-                    if match1:
-                        dnsspoof_path = line.replace("DNSSPOOF_PATH=", "")
-
-                if not os.path.isfile(airbase_path):
-                    if not os.path.isfile("/usr/local/sbin/airbase-ng"):
-                        print_warning(
-                            "Warning airbase-ng was not detected on your system. Using one in SET.")
-                        print_warning(
-                            "If you experience issues, you should install airbase-ng on your system.")
-                        print_warning(
-                            "You can configure it through the set_config and point to airbase-ng.")
-                        airbase_path = ("src/wireless/airbase-ng")
-                    if os.path.isfile("/usr/local/sbin/airbase-ng"):
-                        airbase_path = "/usr/local/sbin/airbase-ng"
+                # config, PATH and the usual locations, resolved once by
+                # src/core/capabilities.py
+                airbase_path = capabilities.tool("airbase-ng")
+                dnsspoof_path = capabilities.tool("dnsspoof")
 
-                if not os.path.isfile(dnsspoof_path):
-                    if os.path.isfile("/usr/local/sbin/dnsspoof"):
-                        dnsspoof_path = "/usr/local/sbin/dnsspoof"
-                    if os.path.isfile("/usr/sbin/dnsspoof"):
-                        dnsspoof_path = "/usr/sbin/dnsspoof"
+                if airbase_path is None:
+                    print_warning(
+                        "Warning airbase-ng was not detected on your system. Using one in SET.")
+                    print_warning(
+                        "If you experience issues, you should install airbase-ng on your system.")
+                    print_warning(
+                        "You can configure it through the set_config and point to airbase-ng.")
+                    airbase_path = ("src/wireless/airbase-ng")
 
                 # if we can find airbase-ng
                 if os.path.isfile(airbase_path):
-                    if os.path.isfile(dnsspoof_path):
+                    if dnsspoof_path is not None:
                         # start the menu here
                         while 1:
 
@@ -1081,34 +890,25 @@ this is how networking works.
                                 setprompt(["8"], ""))
                             # if we want to start access point
                             if wireless_menu_choice == "1":
-                                sys.path.append(definepath + "/src/wireless/")
                                 debug_msg(
                                     me, "importing 'src.wireless.wifiattack'", 1)
-                                try:
-                                    module_reload(wifiattack)
-                                except:
-                                    import wifiattack
+                                import_manager.run("wifiattack", "src/wireless")
 
                             # if we want to stop the wifi attack
                             if wireless_menu_choice == "2":
-                                sys.path.append(definepath + "/src/wireless/")
                                 debug_msg(
                                     me, "importing 'src.wireless.stop_wifiattack'", 1)
-                                try:
-                                    module_reload(stop_wifiattack)
-                                except:
-                                    import stop_wifiattack
+                                import_manager.run("stop_wifiattack", "src/wireless")
 
                             # if we want to return to the main menu
                             if wireless_menu_choice == "99":
                                 print (" [*] Returning to the main menu ...")
                                 break
 
-                if not os.path.isfile(dnsspoof_path):
-                    if not os.path.isfile("/usr/local/sbin/dnsspoof"):
-                        print_error(
-                            "ERROR:DNS Spoof was not detected. Check the set_config file.")
-                        return_continue()
+                if dnsspoof_path is None:
+                    print_error(
+                        "ERROR:DNS Spoof was not detected. Check the set_config file.")
+                    return_continue()
 
         #
         # END WIFI ATTACK MODULE
@@ -1146,19 +946,12 @@ and send the QRCode via a mailer.
 
         # Main Menu choice 9: PowerShell Attacks
         if main_menu_choice == '9':
-            try:
-                module_reload(src.powershell.powershell)
-            except:
-                import src.powershell.powershell
+            import_manager.run("src.powershell.powershell")
 
         # Main Menu choice 11: Third Party Modules
         if main_menu_choice == '10':
-            sys.path.append(definepath + "/src/core")
             debug_msg(me, "importing 'src.core.module_handler'", 1)
-            try:
-                module_reload(module_handler)
-            except:
-                import module_handler
+            import_manager.run("src.core.module_handler")
 
         # Main Menu choice 99: Exit the Social-Engineer Toolkit
         if main_menu_choice == '99':
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# Startup import-time report for the MKSEC entry point
+#
+# Runs the imports setoolkit performs before the first menu under
+# "python -X importtime", prints the slowest modules and fails when the
+# total goes over budget or a deferred module sneaks back into startup.
+#
+#   python3 -m src.core.startup_report [--budget MS] [--top N] [--runs N]
+#
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# top level "import src.core.x" / "from src.core[.y] import x" of setoolkit
+_import_statement = re.compile(r"^(?:from\s+(src\.core[\w.]*)\s+import\s+(\w+)|import\s+(src\.core[\w.]*))")
+
+
+def startup_modules(path=None):
+    """
+    The MKSEC modules setoolkit imports before the first menu is drawn, in
+    order, read from setoolkit itself so the report cannot fall behind it.
+    Only unindented imports count, the conditional ones are not startup.
+    """
+
+    path = path or os.path.join(ROOT, "setoolkit")
+    modules = []
+    with open(path, "r") as fileopen:
+        for line in fileopen:
+            match = _import_statement.match(line)
+            if match is None:
+                continue
+            if match.group(3):
+                name = match.group(3)
+            else:
+                # "from package import name" names a module or something in one
+                package, name = match.group(1), match.group(2)
+                base = os.path.join(ROOT, *(package.split(".") + [name]))
+                if os.path.isfile(base + ".py") or os.path.isdir(base):
+                    name = package + "." + name
+                else:
+                    name = package
+            if name not in modules:
+                modules.append(name)
+    return modules
+
+
+# modules imported by setoolkit before the first menu is drawn
+STARTUP_MODULES = startup_modules()
+
+# total cumulative import time allowed for STARTUP_MODULES, in milliseconds.
+# raise this deliberately (and say why in the commit) if a new module needs it
+STARTUP_BUDGET_MS = 60
+
+# heavy modules that must only be imported by the features that use them
+DEFERRED_MODULES = [
+    "concurrent.futures",
+    "inspect",
+    "logging",
+    "multiprocessing",
+    "random",
+    "socket",
+    "subprocess",
+    "urllib.request",
+]
+
+_line = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure(modules=None, python=None):
+    """
+    Imports the given modules in a fresh interpreter with -X importtime and
+    returns a list of (module, self_us, cumulative_us, depth) tuples.
+    """
+
+    modules = modules or STARTUP_MODULES
+    python = python or sys.executable
+    code = "import " + ", ".join(modules)
+    proc = subprocess.run([python, "-X", "importtime", "-c", code],
+                          cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError("startup import failed:\n" + proc.stderr)
+
+    records = []
+    for line in proc.stderr.splitlines():
+        match = _line.match(line)
+        if match:
+            # importtime indents nested imports by two spaces per level
+            depth = (len(match.group(3)) - 1) // 2
+            records.append((match.group(4), int(match.group(1)), int(match.group(2)), depth))
+    return records
+
+
+def summarize(records, modules=None):
+    modules = modules or STARTUP_MODULES
+    imported = set(name for name, _, _, _ in records)
+    # our modules are the top level entries of the import line, anything else
+    # at depth 0 was loaded by the interpreter itself before -c ran
+    total_us = sum(cumulative for name, _, cumulative, depth in records
+                   if depth == 0 and name in modules)
+    offenders = [name for name in DEFERRED_MODULES if name in imported]
+    return {
+        "total_ms": total_us / 1000.0,
+        "modules": dict((name, cumulative / 1000.0) for name, _, cumulative, _ in records
+                        if name in modules),
+        "deferred_violations": offenders,
+    }
+
+
+def report(budget_ms=STARTUP_BUDGET_MS, top=15, runs=3):
+    # take the best of several runs, the first one also pays for disk cache misses
+    best = None
+    for _ in range(max(1, runs)):
+        records = measure()
+        summary = summarize(records)
+        if best is None or summary["total_ms"] < best[1]["total_ms"]:
+            best = (records, summary)
+    records, summary = best
+
+    print("[*] MKSEC startup import report (best of %d runs)" % runs)
+    print("\n  %10s  %10s  module" % ("self ms", "cumul ms"))
+    for name, self_us, cumulative, depth in sorted(records, key=lambda r: r[1], reverse=True)[:top]:
+        print("  %10.2f  %10.2f  %s" % (self_us / 1000.0, cumulative / 1000.0, name))
+    print("")
+    for name in STARTUP_MODULES:
+        print("[-] %-28s %8.2f ms" % (name, summary["modules"].get(name, 0.0)))
+    print("[-] total %31.2f ms (budget %d ms)" % (summary["total_ms"], budget_ms))
+
+    failed = False
+    if summary["deferred_violations"]:
+        failed = True
+        print("[!] deferred modules imported at startup: %s" % ", ".join(summary["deferred_violations"]))
+    if summary["total_ms"] > budget_ms:
+        failed = True
+        print("[!] startup import time is over budget")
+    if not failed:
+        print("[*] startup is within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="MKSEC startup import-time report")
+    parser.add_argument("--budget", type=int, default=STARTUP_BUDGET_MS,
+                        help="total import budget in milliseconds")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    parser.add_argument("--runs", type=int, default=3, help="number of measurement runs")
+    args = parser.parse_args()
+    sys.exit(report(args.budget, args.top, args.runs))
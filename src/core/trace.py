@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Tracing for MKSEC (debug_msg and mod_name)
+#
+# The level comes from the MKSEC_DEBUG environment variable, or from
+# DEBUG_LEVEL in set.config, instead of a constant that had to be edited
+# before every commit:
+#
+#  0 = Debugging OFF
+#  1 = debug imports only
+#  2 = debug imports with pause for <ENTER>
+#  3 = imports, info messages
+#  4 = imports, info messages with pause for <ENTER>
+#  5 = imports, info messages, menus
+#  6 = imports, info messages, menus with pause for <ENTER>
+#
+# With the level at 0 an event is one comparison. Otherwise events are kept
+# in a bounded ring buffer, which is written next to the MKSEC log if the
+# session dies with an unhandled exception, and echoed to the terminal
+# unless DEBUG_ECHO=OFF (or MKSEC_DEBUG_ECHO=0), so tracing can stay on in
+# production without flooding the menus.
+#
+import os
+import sys
+import time
+from collections import deque
+
+from src.core.config_store import config
+
+# events kept in memory
+RING_SIZE = 2000
+
+_level = 0
+_echo = True
+_ring = deque(maxlen=RING_SIZE)
+_hook_installed = False
+
+
+def _env_int(name):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def configure(level=None, echo=None):
+    """
+    Sets the level and echo mode, from the environment and set.config
+    unless given. Installs the crash dump hook once tracing is on.
+    """
+
+    global _level, _echo
+    if level is None:
+        level = _env_int("MKSEC_DEBUG")
+    if level is None:
+        level = config.get_int("DEBUG_LEVEL", 0)
+    if echo is None:
+        env_echo = _env_int("MKSEC_DEBUG_ECHO")
+        echo = bool(env_echo) if env_echo is not None else config.get_bool("DEBUG_ECHO", True)
+    _level = level
+    _echo = echo
+    if _level > 0:
+        _install_hook()
+
+
+def level():
+    return _level
+
+
+def enabled(msg_type=1):
+    return 0 < msg_type <= _level
+
+
+def caller(depth=1):
+    """
+    Module name (file name without .py, like inspect.getmodulename) of the
+    function depth frames above the one calling this. Only touches the
+    frame objects, no source lines are read.
+    """
+
+    try:
+        filename = sys._getframe(depth + 1).f_code.co_filename
+    except ValueError:
+        return None
+    name = os.path.basename(filename)
+    return name[:-3] if name.endswith(".py") else name
+
+
+def event(module, message, msg_type, *args):
+    # args are only %-formatted into message when the event is kept
+    if _level == 0 or msg_type > _level:
+        return
+    if args:
+        message = message % args
+    _ring.append((time.time(), msg_type, module, message))
+    if _echo:
+        from src.core.core_mksec import bcolors
+        print(bcolors.RED + "\nDEBUG_MSG: from module '" +
+              str(module) + "': " + str(message) + bcolors.ENDC)
+        if _level in (2, 4, 6):
+            input("waiting for <ENTER>\n")
+
+
+def events():
+    return list(_ring)
+
+
+def format_events():
+    lines = []
+    for stamp, msg_type, module, message in list(_ring):
+        lines.append("%s.%03d [%d] %s: %s" % (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stamp)),
+            int(stamp * 1000) % 1000, msg_type, module, message))
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    """ Writes the ring buffer to path (default src/logs/trace-<pid>.log). """
+
+    if path is None:
+        from src.core.logger import log_path
+        path = os.path.join(os.path.dirname(log_path()), "trace-%d.log" % os.getpid())
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as filewrite:
+        filewrite.write(format_events())
+    return path
+
+
+def crash_dump():
+    """
+    Dumps the ring buffer after a crash and says where it went. Called from
+    the excepthook and from the catch-all handler in setoolkit.
+    """
+
+    if not _ring:
+        return None
+    try:
+        path = dump()
+    except (IOError, OSError):
+        return None
+    sys.stderr.write("[!] Trace of the last %d events written to %s\n" % (len(_ring), path))
+    return path
+
+
+def _install_hook():
+    global _hook_installed
+    if _hook_installed:
+        return
+    _hook_installed = True
+    previous = sys.excepthook
+
+    def crash_hook(exc_type, exc_value, exc_traceback):
+        if not issubclass(exc_type, KeyboardInterrupt):
+            crash_dump()
+        previous(exc_type, exc_value, exc_traceback)
+
+    sys.excepthook = crash_hook
+
+
+configure()
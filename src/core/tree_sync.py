@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+#
+# Tree synchronisation for MKSEC (copyfolder and template staging)
+#
+# A source tree is mirrored into a destination: missing or changed files
+# are copied, unchanged ones are skipped. "Changed" is decided from size and
+# mtime (copies keep the source mtime, so an untouched copy always matches),
+# or from a sha256 of the contents in hash mode. Hashes are cached by path,
+# size and mtime and can be persisted in a manifest file so later runs do
+# not re-read unchanged files. Files are copied on a thread pool with
+# copy_file_range/sendfile where the platform has them.
+#
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = 8
+
+# bytes per copy_file_range/sendfile call
+CHUNK = 8 * 1024 * 1024
+
+MODES = ("stat", "hash")
+
+# (path, size, mtime_ns) -> sha256 hex digest
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+
+class SyncReport:
+    """ What a sync copied and skipped, and how fast. """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.copied = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.errors = 0
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, copied=0, skipped=0, size=0, errors=0):
+        with self._lock:
+            self.copied += copied
+            self.skipped += skipped
+            self.bytes += size
+            self.errors += errors
+
+    def finish(self):
+        self.finished = time.time()
+
+    @property
+    def duration(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        # bytes per second actually copied
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    def summary(self):
+        return "copied %d files (%d bytes, %.1f MB/s), skipped %d unchanged in %.3fs (%d errors)" % (
+            self.copied, self.bytes, self.throughput / (1024 * 1024), self.skipped,
+            self.duration, self.errors)
+
+    __str__ = summary
+
+    def as_dict(self):
+        return {"mode": self.mode, "copied": self.copied, "skipped": self.skipped,
+                "bytes": self.bytes, "errors": self.errors, "duration": self.duration,
+                "throughput": self.throughput}
+
+
+def file_hash(path, st=None):
+    import hashlib
+    st = st or os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        digest = _hash_cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as fileopen:
+            for chunk in iter(lambda: fileopen.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _hash_lock:
+            _hash_cache[key] = digest
+    return digest
+
+
+def load_manifest(path):
+    # seeds the hash cache from a manifest written by save_manifest()
+    try:
+        with open(path, "r") as fileopen:
+            entries = json.load(fileopen)
+    except (IOError, OSError, ValueError):
+        return
+    with _hash_lock:
+        for entry in entries:
+            try:
+                _hash_cache[(entry[0], entry[1], entry[2])] = entry[3]
+            except (IndexError, TypeError):
+                continue
+
+
+def save_manifest(path, root=None):
+    with _hash_lock:
+        entries = [list(key) + [digest] for key, digest in _hash_cache.items()
+                   if root is None or key[0].startswith(root)]
+    tmp_path = "%s.tmp-%d" % (path, os.getpid())
+    try:
+        with open(tmp_path, "w") as filewrite:
+            json.dump(entries, filewrite)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def _unchanged(source, source_st, dest, mode):
+    try:
+        dest_st = os.stat(dest)
+    except OSError:
+        return False
+    if source_st.st_size != dest_st.st_size:
+        return False
+    if mode == "hash":
+        return file_hash(source, source_st) == file_hash(dest, dest_st)
+    return source_st.st_mtime_ns == dest_st.st_mtime_ns
+
+
+def _copy_data(source_fd, dest_fd, size):
+    """
+    Copies size bytes between two descriptors in the kernel when possible:
+    copy_file_range first, then sendfile, then a plain read/write loop.
+    """
+
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                sent = os.copy_file_range(source_fd, dest_fd, min(CHUNK, size - copied))
+                if sent == 0:
+                    break
+                copied += sent
+            if copied >= size:
+                return
+        except OSError:
+            # e.g. EXDEV on older kernels or a filesystem without support
+            pass
+    if hasattr(os, "sendfile"):
+        try:
+            while copied < size:
+                sent = os.sendfile(dest_fd, source_fd, copied, min(CHUNK, size - copied))
+                if sent == 0:
+                    break
+                copied += sent
+            if copied >= size:
+                return
+        except OSError:
+            pass
+    os.lseek(source_fd, copied, os.SEEK_SET)
+    os.lseek(dest_fd, copied, os.SEEK_SET)
+    while True:
+        data = os.read(source_fd, 1024 * 1024)
+        if not data:
+            break
+        os.write(dest_fd, data)
+
+
+def copy_file(source, dest, source_st=None):
+    """
+    copy2 equivalent that writes into a temporary file and renames it over
+    dest, so a refreshed file is never seen half written.
+    """
+
+    source_st = source_st or os.stat(source)
+    tmp_path = "%s.tmp-%d-%d" % (dest, os.getpid(), threading.get_ident())
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        dest_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            _copy_data(source_fd, dest_fd, source_st.st_size)
+        finally:
+            os.close(dest_fd)
+    finally:
+        os.close(source_fd)
+    try:
+        shutil.copystat(source, tmp_path)
+        os.replace(tmp_path, dest)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _sync_file(source, dest, mode, report):
+    try:
+        source_st = os.stat(source)
+        if _unchanged(source, source_st, dest, mode):
+            report.add(skipped=1)
+            return
+        copy_file(source, dest, source_st)
+        report.add(copied=1, size=source_st.st_size)
+    except (IOError, OSError):
+        report.add(errors=1)
+
+
+def sync(source, dest, mode="stat", workers=WORKERS, manifest=None):
+    """
+    Mirrors the tree under source into dest and returns a SyncReport.
+    Files that only exist in dest are left alone. manifest is an optional
+    file used to persist content hashes between runs in hash mode.
+    """
+
+    if mode not in MODES:
+        raise ValueError("mode must be one of %s" % ", ".join(MODES))
+    report = SyncReport(mode)
+    if manifest and mode == "hash":
+        load_manifest(manifest)
+
+    # directories are created up front so the workers only deal with files
+    tasks = []
+    for root, dirs, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        target = dest if relative == os.curdir else os.path.join(dest, relative)
+        if not os.path.isdir(target):
+            try:
+                os.makedirs(target)
+            except OSError:
+                report.add(errors=len(files))
+                continue
+        for name in files:
+            tasks.append((os.path.join(root, name), os.path.join(target, name)))
+
+    if len(tasks) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for source_file, dest_file in tasks:
+                pool.submit(_sync_file, source_file, dest_file, mode, report)
+    else:
+        for source_file, dest_file in tasks:
+            _sync_file(source_file, dest_file, mode, report)
+
+    if manifest and mode == "hash":
+        save_manifest(manifest)
+    report.finish()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Mirror a directory tree, skipping unchanged files")
+    parser.add_argument("source")
+    parser.add_argument("dest")
+    parser.add_argument("--hash", action="store_true", help="compare contents instead of size and mtime")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--manifest", help="file to keep content hashes in between runs")
+    args = parser.parse_args()
+    result = sync(args.source, args.dest, "hash" if args.hash else "stat", args.workers, args.manifest)
+    print("[*] %s -> %s: %s" % (args.source, args.dest, result.summary()))
+    sys.exit(1 if result.errors else 0)
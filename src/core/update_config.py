@@ -1,5 +1,4 @@
 #!/usr/bin/env python
-import sys
 
 """
 update_config.py:
@@ -10,94 +9,183 @@ update_config.py:
     as "ON" or "OFF", but yet SET operates with a module from
     which variables can be imported and boolean values operated
     upon.
+
+    Alongside set_config.py a typed JSON snapshot is written, and both
+    are only regenerated when the sha256 of set.config changes.
 """
 import os
+import json
+import hashlib
+from types import MappingProxyType
 from src.core.core_mksec import print_status, print_info, print_error, return_continue
+from src.core.config_store import CONFIG_PATH
 import datetime
-from time import sleep
 
 definepath = os.getcwd()
 
+# generated files live next to set.config
+CONFIG_DIR = os.path.dirname(CONFIG_PATH)
+GENERATED_PATH = os.path.join(CONFIG_DIR, "set_config.py")
+SNAPSHOT_PATH = os.path.join(CONFIG_DIR, "set_config.json")
+
 # TODO
 # * integers should not have quotes
 # * paths should be double-quoted
 # * Booleans should not be quoted
 
 
+# settings whose value is written quoted into set_config.py
+QUOTED_SETTINGS = MappingProxyType({
+    'METASPLOIT_PATH': True,
+    'METASPLOIT_DATABASE': True,
+    'ENCOUNT': False,
+    'AUTO_MIGRATE': False,
+    'CUSTOM_EXE': True,
+    'BACKDOOR_EXECUTION': False,
+    'METERPRETER_MULTI_SCRIPT': False,
+    'LINUX_METERPRETER_MULTI_SCRIPT': False,
+    'METERPRETER_MULTI_COMMANDS': True,
+    'LINUX_METERPRETER_MULTI_COMMANDS': True,
+    'METASPLOIT_IFRAME_PORT': False,
+    'ETTERCAP': False,
+    'ETTERCAP_PATH': True,
+    'ETTERCAP_DSNIFF_INTERFACE': True,
+    'DSNIFF': False,
+    'AUTO_DETECT': False,
+    'SENDMAIL': False,
+    'EMAIL_PROVIDER': True,
+    'WEBATTACK_EMAIL': False,
+    'APACHE_SERVER': False,
+    'APACHE_DIRECTORY': True,
+    'WEB_PORT': False,
+    'JAVA_ID_PARAM': True,
+    'JAVA_REPEATER': False,
+    'JAVA_TIME': True,
+    'WEBATTACK_SSL': False,
+    'SELF_SIGNED_CERT': False,
+    'PEM_CLIENT': True,
+    'PEM_SERVER': True,
+    'WEBJACKING_TIME': False,
+    'COMMAND_CENTER_INTERFACE': True,
+    'COMMAND_CENTER_PORT': False,
+    'SET_INTERACTIVE_SHELL': False,
+    'TERMINAL': True,
+    'DIGITAL_SIGNATURE_STEAL': False,
+    'UPX_ENCODE': False,
+    'UPX_PATH': True,
+    'AUTO_REDIRECT': False,
+    'HARVESTER_REDIRECT': False,
+    'HARVESTER_URL': True,
+    'UNC_EMBED': False,
+    'ACCESS_POINT_SSID': True,
+    'AIRBASE_NG_PATH': True,
+    'DNSSPOOF_PATH': True,
+    'AP_CHANNEL': False,
+    'POWERSHELL_INJECTION': False,
+    'POWERSHELL_VERBOSE': False,
+    'WEB_PROFILER': False,
+    'OSX_REVERSE_PORT': False,
+    'LINUX_REVERSE_PORT': False,
+    'USER_AGENT_STRING': True,
+    'SET_SHELL_STAGER': False,
+    'AUTOMATIC_LISTENER': False,
+    'METASPLOIT_MODE': False,
+    'HARVESTER_LOG': True,
+    'STAGE_ENCODING': False,
+    'TRACK_EMAIL_ADDRESSES': False,
+    'WGET_DEEP': True
+})
+
+
 def value_type(value):
     """ Determines whether the setting parameter should be quoted. """
 
-    return {
-        'METASPLOIT_PATH': True,
-        'METASPLOIT_DATABASE': True,
-        'ENCOUNT': False,
-        'AUTO_MIGRATE': False,
-        'CUSTOM_EXE': True,
-        'BACKDOOR_EXECUTION': False,
-        'METERPRETER_MULTI_SCRIPT': False,
-        'LINUX_METERPRETER_MULTI_SCRIPT': False,
-        'METERPRETER_MULTI_COMMANDS': True,
-        'LINUX_METERPRETER_MULTI_COMMANDS': True,
-        'METASPLOIT_IFRAME_PORT': False,
-        'ETTERCAP': False,
-        'ETTERCAP_PATH': True,
-        'ETTERCAP_DSNIFF_INTERFACE': True,
-        'DSNIFF': False,
-        'AUTO_DETECT': False,
-        'SENDMAIL': False,
-        'EMAIL_PROVIDER': True,
-        'WEBATTACK_EMAIL': False,
-        'APACHE_SERVER': False,
-        'APACHE_DIRECTORY': True,
-        'WEB_PORT': False,
-        'JAVA_ID_PARAM': True,
-        'JAVA_REPEATER': False,
-        'JAVA_TIME': True,
-        'WEBATTACK_SSL': False,
-        'SELF_SIGNED_CERT': False,
-        'PEM_CLIENT': True,
-        'PEM_SERVER': True,
-        'WEBJACKING_TIME': False,
-        'COMMAND_CENTER_INTERFACE': True,
-        'COMMAND_CENTER_PORT': False,
-        'SET_INTERACTIVE_SHELL': False,
-        'TERMINAL': True,
-        'DIGITAL_SIGNATURE_STEAL': False,
-        'UPX_ENCODE': False,
-        'UPX_PATH': True,
-        'AUTO_REDIRECT': False,
-        'HARVESTER_REDIRECT': False,
-        'HARVESTER_URL': True,
-        'UNC_EMBED': False,
-        'ACCESS_POINT_SSID': True,
-        'AIRBASE_NG_PATH': True,
-        'DNSSPOOF_PATH': True,
-        'AP_CHANNEL': False,
-        'POWERSHELL_INJECTION': False,
-        'POWERSHELL_VERBOSE': False,
-        'WEB_PROFILER': False,
-        'OSX_REVERSE_PORT': False,
-        'LINUX_REVERSE_PORT': False,
-        'USER_AGENT_STRING': True,
-        'SET_SHELL_STAGER': False,
-        'AUTOMATIC_LISTENER': False,
-        'METASPLOIT_MODE': False,
-        'HARVESTER_LOG': True,
-        'STAGE_ENCODING': False,
-        'TRACK_EMAIL_ADDRESSES': False,
-        'WGET_DEEP': True
-    }.get(value, "ERROR")
-
-
-def update_config():
-    if not os.path.isdir("/etc/setoolkit"):
-        os.makedirs("/etc/setoolkit")
-
-    init_file = open("/etc/setoolkit/set.config", "r")
-    new_config = open("/etc/setoolkit/set_config.py", "w")
-    timestamp = str(datetime.datetime.now())
+    return QUOTED_SETTINGS.get(value, "ERROR")
+
+
+def config_hash(path=None):
+    """ Returns the sha256 of the raw set.config contents. """
+
+    path = path or CONFIG_PATH
+    digest = hashlib.sha256()
+    with open(path, "rb") as fileopen:
+        for chunk in iter(lambda: fileopen.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def typed_value(value):
+    """ Converts a raw set.config value into the type SET operates on. """
+
+    if value == "ON":
+        return True
+    if value == "OFF":
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def load_snapshot(path=None):
+    """
+    Returns the typed settings dict written by update_config(), or None
+    if there is no usable snapshot. Much cheaper than importing the
+    generated set_config.py.
+    """
+
+    path = path or SNAPSHOT_PATH
+    try:
+        with open(path, "r") as fileopen:
+            return json.load(fileopen)
+    except (IOError, ValueError):
+        return None
+
 
-    new_config.write("""#!/usr/bin/python\n
+def _atomic_write(path, data):
+    # write next to the target and rename over it so readers never see
+    # a half-written file
+    tmp_path = "%s.tmp-%d" % (path, os.getpid())
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        with os.fdopen(fd, "w") as filewrite:
+            filewrite.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_config_date(path):
+    # pull CONFIG_DATE back out of the generated header without importing it
+    with open(path, "r") as fileopen:
+        for line in fileopen:
+            if line.startswith("CONFIG_DATE="):
+                return line.rstrip().split("=", 1)[1].strip("'")
+    return None
+
+
+def update_config(force=False):
+    """
+    Regenerates set_config.py and its typed snapshot from set.config.
+
+    Regeneration is skipped when the sha256 of set.config matches the one
+    recorded in the last snapshot, unless force is set. Returns True if
+    the files were rewritten.
+    """
+
+    if not os.path.isdir(CONFIG_DIR):
+        os.makedirs(CONFIG_DIR)
+
+    current_hash = config_hash()
+    if not force and os.path.isfile(GENERATED_PATH):
+        snapshot = load_snapshot()
+        if snapshot is not None and snapshot.get("CONFIG_HASH") == current_hash:
+            return False
+
+    timestamp = str(datetime.datetime.now())
+    generated = ["""#!/usr/bin/python\n
 #######################################################################
 ##                    DO NOT MODIFY THIS FILE                        ##
 #######################################################################
@@ -110,35 +198,35 @@ def update_config():
 #  set.config.py generated: """ + timestamp + """                     #
 #                                                                     #
 #######################################################################
-CONFIG_DATE='""" + timestamp + """'\n""")
-    for line in init_file:
-        try:
-            if not line.startswith("#"):
-                line = line.rstrip()
-                line = line.split("=")
-                setting = line[0]
-                value = line[1]
-                if value == "ON":
-                    value = "True"
-                elif value == "OFF":
-                    value = "False"
-                else:
-                    pass
-
-                quoted = value_type(setting)
-
-                if quoted:
-                    new_config.write(setting + '="' + value + '"\n')
-                else:
-                    new_config.write(setting + '=' + value + '\n')
-        except:
-            pass
-
-    init_file.close()
-    new_config.close()
-    sleep(1)
-    sys.path.append("/etc/setoolkit")
-    from set_config import CONFIG_DATE as verify
+CONFIG_DATE='""" + timestamp + """'
+CONFIG_HASH='""" + current_hash + """'\n"""]
+    snapshot = {"CONFIG_DATE": timestamp, "CONFIG_HASH": current_hash}
+
+    with open(CONFIG_PATH, "r") as init_file:
+        for line in init_file:
+            if line.startswith("#"):
+                continue
+            line = line.rstrip()
+            if "=" not in line:
+                continue
+            setting, value = line.split("=", 1)
+            snapshot[setting] = typed_value(value)
+            if value == "ON":
+                value = "True"
+            elif value == "OFF":
+                value = "False"
+
+            quoted = value_type(setting)
+
+            if quoted:
+                generated.append(setting + '="' + value + '"\n')
+            else:
+                generated.append(setting + '=' + value + '\n')
+
+    _atomic_write(GENERATED_PATH, "".join(generated))
+    _atomic_write(SNAPSHOT_PATH, json.dumps(snapshot))
+
+    verify = _read_config_date(GENERATED_PATH)
     print_info("New set.config.py file generated on: %s" % timestamp)
     print_info("Verifying configuration update...")
     if verify == timestamp:
@@ -147,6 +235,7 @@ CONFIG_DATE='""" + timestamp + """'\n""")
         print_error("Update failed? Timestamp on config file is: %s" % verify)
     print_status("SET is using the new config, no need to restart")
     # return_continue()
+    return True
 
 if __name__ == "__main__":
-    update_config()
+    update_config(force=True)
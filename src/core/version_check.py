@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#
+# Background, TTL-cached check for new MKSEC releases
+#
+# The upstream version file is fetched at most once per VERSION_CHECK_TTL
+# seconds (set.config, default one day) as a background job. The result and
+# the ETag/Last-Modified validators are persisted in ~/.set/version.lock so
+# later sessions can send a conditional request, or skip the network
+# entirely while the cache is fresh. Nothing in here ever blocks the caller.
+#
+import json
+import os
+import threading
+import time
+
+from src.core.config_store import config
+
+VERSION_URL = "https://raw.githubusercontent.com/generatorexit/mksec/main/src/core/mksec.version"
+
+# one day unless set.config says otherwise
+DEFAULT_TTL = 86400
+
+# seconds we allow the fetch itself before giving up
+FETCH_TIMEOUT = 8
+
+# after a failed fetch, wait this long before trying again in the same session
+RETRY_DELAY = 300
+
+_lock = threading.Lock()
+_worker = None
+_state = None
+# last failed fetch, written by the job and read by the menus, under _lock
+_last_error = None
+_failed_at = 0
+
+
+def _cache_path():
+    # imported here to avoid a circular import with core_mksec
+    from src.core.core_mksec import userconfigpath
+    return os.path.join(userconfigpath, "version.lock")
+
+
+def _ttl():
+    return config.get_int("VERSION_CHECK_TTL", DEFAULT_TTL)
+
+
+def _load():
+    state = {"version": "", "etag": None, "last_modified": None, "checked": 0}
+    try:
+        with open(_cache_path(), "r") as fileopen:
+            data = fileopen.read()
+    except IOError:
+        return state
+    try:
+        cached = json.loads(data)
+    except ValueError:
+        cached = None
+    if isinstance(cached, dict):
+        state.update(cached)
+    else:
+        # version.lock from older releases only held the version string
+        state["version"] = data.strip()
+    return state
+
+
+def _save(state):
+    path = _cache_path()
+    tmp_path = "%s.tmp-%d" % (path, os.getpid())
+    try:
+        with open(tmp_path, "w") as filewrite:
+            json.dump(state, filewrite)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def _current():
+    # caller holds _lock
+    global _state
+    if _state is None:
+        _state = _load()
+    return dict(_state)
+
+
+def _failed(error):
+    global _last_error, _failed_at
+    with _lock:
+        _last_error, _failed_at = error, time.time()
+
+
+def _fetch(state):
+    global _state, _last_error
+    try:
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError
+    except ImportError:
+        from urllib2 import Request, urlopen, HTTPError
+
+    request = Request(VERSION_URL)
+    if state.get("etag"):
+        request.add_header("If-None-Match", state["etag"])
+    if state.get("last_modified"):
+        request.add_header("If-Modified-Since", state["last_modified"])
+
+    try:
+        response = urlopen(request, timeout=FETCH_TIMEOUT)
+        state["version"] = response.read().rstrip().decode("utf-8")
+        state["etag"] = response.headers.get("ETag")
+        state["last_modified"] = response.headers.get("Last-Modified")
+    except HTTPError as error:
+        # 304 means our cached version is still current
+        if error.code != 304:
+            _failed(error)
+            return
+    except Exception as error:
+        _failed(error)
+        return
+
+    state["checked"] = time.time()
+    with _lock:
+        _last_error = None
+        _state = state
+    _save(state)
+
+
+def _fetch_job(job, state):
+    job.progress = "fetching %s" % VERSION_URL
+    _fetch(state)
+
+
+def is_stale():
+    with _lock:
+        state = _current()
+    return time.time() - state.get("checked", 0) >= _ttl()
+
+
+def start_check():
+    """
+    Kicks off a background refresh if the cached result is older than the
+    TTL and no refresh is already running. Returns immediately.
+    """
+
+    global _worker
+    if not is_stale():
+        return False
+    from src.core import jobs
+    with _lock:
+        if _last_error is not None and time.time() - _failed_at < RETRY_DELAY:
+            return False
+        if _worker is not None and _worker.active:
+            return False
+        # a failure is already reported by the banner itself
+        _worker = jobs.submit("version check", _fetch_job, _current(), quiet=True)
+    return True
+
+
+def latest_version():
+    # newest upstream version we know about, "" if we have never seen one
+    with _lock:
+        return _current().get("version", "")
+
+
+def last_error():
+    with _lock:
+        return _last_error